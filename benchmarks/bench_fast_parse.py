@@ -0,0 +1,96 @@
+"""
+Compares analysis time of the default and fast parse modes on large, synthetic headers.
+
+Each header includes a shared set of bulky common headers, contains large inline function bodies and nested
+declarations, and only a handful of enums; the shape that fast parsing is meant to help with.
+
+    python benchmarks/bench_fast_parse.py --libclangpath /usr/lib/llvm-14/lib/libclang.so
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from codegen import codegen
+
+
+def write_common_header(path: str, index: int, functions: int) -> None:
+    with open(path, 'w') as f:
+        f.write('#pragma once\nnamespace common%d {\n' % index)
+        for i in range(functions):
+            f.write('inline int Func%d(int a) {\n' % i)
+            f.write('    int b = a;\n')
+            for j in range(20):
+                f.write('    if (b %% %d == 0) { b += %d; } else { b -= a * %d; }\n' % (j + 2, j, j))
+            f.write('    return b;\n}\n')
+        f.write('}\n')
+
+
+def write_header(path: str, common_headers: int, functions: int, enums: int) -> None:
+    with open(path, 'w') as f:
+        f.write('#pragma once\n')
+        for i in range(common_headers):
+            f.write('#include "common%d.h"\n' % i)
+        f.write('namespace game { namespace world {\n')
+        for i in range(enums):
+            f.write('enum class EKind%d { Invalid = -1, A, B, C, D };\n' % i)
+        f.write('class CActor {\npublic:\n')
+        for i in range(functions):
+            f.write('    int Update%d(int t) {\n        int x = t;\n' % i)
+            for j in range(20):
+                f.write('        for (int k = 0; k < %d; ++k) { x = common0::Func%d(x + k); }\n'
+                        % (j + 1, j % max(1, functions)))
+            f.write('        return x;\n    }\n')
+        f.write('};\n}}\n')
+
+
+def time_analysis(clang_index, headers, fast_parse: bool, repeat: int) -> float:
+    environment = codegen.CxxCompileEnvironment([os.path.dirname(headers[0])])
+    environment.FastParse = fast_parse
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for header in headers:
+            codegen.SourceFile(header).Analyze(clang_index, environment)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main() -> int:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--libclangpath', help='Path to libclang library file', required=True)
+    argparser.add_argument('--headers', help='Number of headers to analyze', type=int, default=5)
+    argparser.add_argument('--common-headers', help='Number of shared headers each header includes', type=int,
+                           default=4)
+    argparser.add_argument('--functions', help='Number of inline functions per header', type=int, default=20)
+    argparser.add_argument('--enums', help='Number of enums per header', type=int, default=4)
+    argparser.add_argument('--repeat', help='Number of timed runs; the best one is reported', type=int, default=3)
+    args = argparser.parse_args()
+
+    clang_index = codegen.CreateClangIndex(args.libclangpath)
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for i in range(args.common_headers):
+            write_common_header(os.path.join(corpus_dir, 'common%d.h' % i), i, args.functions)
+        headers = []
+        for i in range(args.headers):
+            header = os.path.join(corpus_dir, 'header%d.h' % i)
+            write_header(header, args.common_headers, args.functions, args.enums)
+            headers.append(header)
+
+        default_time = time_analysis(clang_index, headers, False, args.repeat)
+        fast_time = time_analysis(clang_index, headers, True, args.repeat)
+
+    print('%-10s %10s %12s' % ('mode', 'total (s)', 'per file (ms)'))
+    print('%-10s %10.3f %12.2f' % ('default', default_time, default_time * 1000 / args.headers))
+    print('%-10s %10.3f %12.2f' % ('fast', fast_time, fast_time * 1000 / args.headers))
+    print('speedup: %.2fx' % (default_time / fast_time))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,87 @@
+"""
+Compares the latency of single-file commands run through the codegen server against cold runs of the command line
+tool, both for headers that have to be parsed and for ones answered from a warm cache.
+
+    python benchmarks/bench_server.py --libclangpath /usr/lib/llvm-14/lib/libclang.so --headers 20
+
+The server gets a private socket, and is stopped when the benchmark is done.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from codegen import client
+from corpus import add_corpus_arguments, config_from_arguments, generate_corpus
+
+repository_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_timed(command: List[str], environment: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> int:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--libclangpath', help='Path to libclang library file', required=True)
+    argparser.add_argument('--jobs', '-j', help='Server worker processes; 0 uses one per CPU', type=int, default=0)
+    add_corpus_arguments(argparser)
+    argparser.set_defaults(headers=20)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_root = os.path.join(directory, 'src')
+        headers = generate_corpus(source_root, config_from_arguments(args))
+        socket_path = os.path.join(directory, 'codegen.sock')
+        environment = dict(os.environ, PYTHONPATH=os.path.abspath(repository_root), CODEGEN_SOCKET=socket_path)
+
+        server = subprocess.Popen([sys.executable, '-m', 'codegen', 'serve', '--socket', socket_path,
+                                   '--jobs', str(args.jobs)], env=environment, stderr=subprocess.DEVNULL)
+        try:
+            tools = {
+                'cli': [sys.executable, '-m', 'codegen'],
+                'server': [sys.executable, '-m', 'codegen.client'],
+            }
+            results: Dict[str, Dict[str, List[float]]] = {}
+            for tool, tool_command in tools.items():
+                output_root = os.path.join(directory, 'out_' + tool)
+                common = ['--libclangpath', args.libclangpath, '--source-root', source_root,
+                          '--output-root', output_root, '--cache-path', os.path.join(directory, 'cache_' + tool)]
+
+                # Untimed, so that the server has its workers up and libclang loaded before the first timed request
+                run_timed(tool_command + ['get_output_files', headers[0]] + common, environment)
+                results[tool] = {
+                    'parse': [run_timed(tool_command + ['generate', header] + common, environment)
+                              for header in headers[1:]],
+                    'cached': [run_timed(tool_command + ['generate', header] + common, environment)
+                               for header in headers[1:]],
+                }
+        finally:
+            client.stop_server(socket_path)
+            server.wait()
+
+    print('%-8s %-8s %10s %10s' % ('', '', 'median', 'p90'))
+    for tool, modes in results.items():
+        for mode, times in modes.items():
+            print('%-8s %-8s %7.1f ms %7.1f ms' % (tool, mode, statistics.median(times), percentile(times, 0.9)))
+    for mode in ('parse', 'cached'):
+        print('Server speedup (%s): %.1fx' % (
+            mode, statistics.median(results['cli'][mode]) / statistics.median(results['server'][mode])))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,89 @@
+"""
+Checks the startup time of the command line tool against a budget, for the invocations a configure run makes
+thousands of: --help, and get_output_files and generate answered from a warm cache.
+
+Cache hits must not import libclang's bindings or the template compiler; the check fails if they do, or if the median
+wall time of an invocation exceeds the budget.
+
+    python benchmarks/bench_startup.py --libclangpath /usr/lib/llvm-14/lib/libclang.so --budget-ms 100
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+repository_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules that runs answered from the cache must never import
+deferred_modules = ('clang.cindex', 'mako.template', 'mako.lookup', 'multiprocessing')
+
+
+def run_tool(arguments: List[str], cwd: str, import_time: bool = False) -> Tuple[float, str]:
+    """Runs the tool in a fresh interpreter, and returns its wall time in seconds along with its stderr"""
+    environment = dict(os.environ, PYTHONPATH=os.path.abspath(repository_root))
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + ['-m', 'codegen'] + arguments
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=cwd, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0 and '--help' not in arguments:
+        raise RuntimeError('%s failed:\n%s' % (' '.join(command), process.stderr))
+    return elapsed, process.stderr
+
+
+def get_imported_modules(import_time_output: str) -> List[str]:
+    # Lines look like "import time:   self [us] | cumulative | module", with the module indented by nesting depth
+    return [line.rsplit('|', 1)[1].strip() for line in import_time_output.splitlines()
+            if line.startswith('import time:') and line.count('|') == 2]
+
+
+def main() -> int:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--libclangpath', help='Path to libclang library file', required=True)
+    argparser.add_argument('--budget-ms', help='Largest acceptable median wall time of an invocation', type=float,
+                           default=100)
+    argparser.add_argument('--repeat', help='Number of runs per invocation', type=int, default=10)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_root = os.path.join(directory, 'src')
+        os.makedirs(source_root)
+        header = os.path.join(source_root, 'Startup.h')
+        with open(header, 'w') as f:
+            f.write('#pragma once\nenum class EStartup { First, Second, Third };\n')
+
+        common = ['--libclangpath', args.libclangpath, '--source-root', source_root,
+                  '--output-root', os.path.join(directory, 'out'), '--cache-path', os.path.join(directory, 'cache')]
+        invocations = {
+            'help': ['--help'],
+            'get_output_files': ['get_output_files', header] + common,
+            'generate': ['generate', header] + common,
+        }
+
+        # Warm the cache, then make sure the warm runs really leave the deferred modules alone
+        run_tool(invocations['generate'], directory)
+        failures = []
+        for name, arguments in invocations.items():
+            imported = set(get_imported_modules(run_tool(arguments, directory, import_time=True)[1]))
+            for module in deferred_modules:
+                if module in imported:
+                    failures.append('%s imports %s' % (name, module))
+
+        for name, arguments in invocations.items():
+            times = [run_tool(arguments, directory)[0] * 1000 for _ in range(args.repeat)]
+            median = statistics.median(times)
+            print('%-18s median %7.1f ms  min %7.1f ms' % (name, median, min(times)))
+            if median > args.budget_ms:
+                failures.append('%s took %.1f ms, over the budget of %.1f ms' % (name, median, args.budget_ms))
+
+    for failure in failures:
+        print('FAIL: ' + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    exit(main())
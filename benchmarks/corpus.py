@@ -0,0 +1,137 @@
+"""
+Generates a synthetic corpus of C++ headers to benchmark codegen with.
+
+    python benchmarks/corpus.py OUTPUT_DIR --headers 200 --enums 4 --constants 16 --depth 2 --bulk 200
+"""
+import argparse
+import os
+from typing import List
+
+
+class CorpusConfig(object):
+    """Shape of a generated corpus"""
+    def __init__(
+            self,
+            headers: int = 100,
+            enums: int = 4,
+            constants: int = 16,
+            depth: int = 2,
+            bulk: int = 100,
+            common_headers: int = 2
+    ) -> None:
+        # Number of headers to analyze
+        self.headers = headers
+        # Enums per header
+        self.enums = enums
+        # Constants per enum
+        self.constants = constants
+        # Number of nested namespaces and classes around each enum
+        self.depth = depth
+        # Lines of non-enum code (declarations and inline function bodies) per header
+        self.bulk = bulk
+        # Number of shared headers every header includes
+        self.common_headers = common_headers
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def _write_bulk(lines: List[str], count: int, indent: str, prefix: str) -> None:
+    """Appends roughly count lines of enum-free code: small structs, and functions with bodies"""
+    written = 0
+    index = 0
+    while written < count:
+        if index % 2 == 0:
+            lines.append('%sstruct %sData%d { int a; float b; const char* c; };' % (indent, prefix, index))
+            written += 1
+        else:
+            lines.append('%sinline int %sCompute%d(int x) {' % (indent, prefix, index))
+            lines.append('%s    int y = x * %d;' % (indent, index))
+            lines.append('%s    for (int i = 0; i < x; ++i) { y += i %% %d; }' % (indent, index + 1))
+            lines.append('%s    return y;' % indent)
+            lines.append('%s}' % indent)
+            written += 5
+        index += 1
+
+
+def _write_header(path: str, header_index: int, config: CorpusConfig) -> None:
+    lines = ['#pragma once']
+    lines += ['#include "common%d.h"' % i for i in range(config.common_headers)]
+
+    # Alternate between namespaces and classes for the enclosing scopes
+    closers = []
+    for level in range(config.depth):
+        indent = '    ' * level
+        if level % 2 == 0:
+            lines.append('%snamespace ns%d_%d {' % (indent, header_index, level))
+            closers.append('%s}' % indent)
+        else:
+            lines.append('%sclass CScope%d_%d {' % (indent, header_index, level))
+            lines.append('%spublic:' % indent)
+            closers.append('%s};' % indent)
+
+    indent = '    ' * config.depth
+    _write_bulk(lines, config.bulk // 2, indent, 'Pre')
+    for enum_index in range(config.enums):
+        lines.append('%senum class EHeader%dEnum%d {' % (indent, header_index, enum_index))
+        lines.append('%s    Invalid = -1,' % indent)
+        for constant_index in range(config.constants):
+            lines.append('%s    Constant%d,' % (indent, constant_index))
+        lines.append('%s};' % indent)
+    _write_bulk(lines, config.bulk - config.bulk // 2, indent, 'Post')
+
+    lines += reversed(closers)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def _write_common_header(path: str, index: int, config: CorpusConfig) -> None:
+    lines = ['#pragma once', 'namespace common%d {' % index]
+    _write_bulk(lines, max(config.bulk, 50), '    ', 'Common')
+    lines.append('}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def generate_corpus(directory: str, config: CorpusConfig) -> List[str]:
+    """Writes a corpus to directory, and returns the paths of the headers to analyze"""
+    os.makedirs(directory, exist_ok=True)
+    for index in range(config.common_headers):
+        _write_common_header(os.path.join(directory, 'common%d.h' % index), index, config)
+
+    headers = []
+    for index in range(config.headers):
+        header = os.path.join(directory, 'header%d.h' % index)
+        _write_header(header, index, config)
+        headers.append(header)
+    return headers
+
+
+def add_corpus_arguments(argparser: argparse.ArgumentParser) -> None:
+    defaults = CorpusConfig()
+    argparser.add_argument('--headers', help='Number of headers', type=int, default=defaults.headers)
+    argparser.add_argument('--enums', help='Enums per header', type=int, default=defaults.enums)
+    argparser.add_argument('--constants', help='Constants per enum', type=int, default=defaults.constants)
+    argparser.add_argument('--depth', help='Namespace and class nesting depth around enums', type=int,
+                           default=defaults.depth)
+    argparser.add_argument('--bulk', help='Lines of non-enum code per header', type=int, default=defaults.bulk)
+    argparser.add_argument('--common-headers', help='Shared headers included by every header', type=int,
+                           default=defaults.common_headers)
+
+
+def config_from_arguments(args: argparse.Namespace) -> CorpusConfig:
+    return CorpusConfig(args.headers, args.enums, args.constants, args.depth, args.bulk, args.common_headers)
+
+
+def main() -> int:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('directory', help='Directory to write the corpus to')
+    add_corpus_arguments(argparser)
+    args = argparser.parse_args()
+    headers = generate_corpus(args.directory, config_from_arguments(args))
+    print('Wrote %d headers to %s' % (len(headers), args.directory))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,230 @@
+"""
+Benchmarks codegen on a synthetic header corpus, and compares results against a stored baseline.
+
+    python benchmarks/suite.py run --libclangpath /usr/lib/llvm-14/lib/libclang.so --output results.json
+    python benchmarks/suite.py compare baseline.json results.json
+
+Each benchmark runs in a fresh process, so that peak memory is measured per benchmark and the end-to-end run pays for
+loading libclang like a real invocation does.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import codegen
+from corpus import add_corpus_arguments, config_from_arguments, generate_corpus
+
+# Metrics where a higher value is better; everything else is better when lower
+higher_is_better = {'files_per_sec', 'enums_per_sec'}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_analyze(headers: List[str], settings: dict) -> Tuple[int, float]:
+    from codegen import codegen as cg
+
+    clang_index = cg.CreateClangIndex(settings['libclangpath'])
+    environment = cg.CxxCompileEnvironment([os.path.dirname(headers[0])])
+    environment.FastParse = settings['fast_parse']
+
+    start = time.perf_counter()
+    enums = 0
+    for header in headers:
+        file = cg.SourceFile(header)
+        file.Analyze(clang_index, environment)
+        enums += len(file.Enums)
+    return enums, time.perf_counter() - start
+
+
+def bench_render(headers: List[str], settings: dict) -> Tuple[int, float]:
+    from codegen import codegen as cg
+    from codegen import templates
+
+    clang_index = cg.CreateClangIndex(settings['libclangpath'])
+    environment = cg.CxxCompileEnvironment([os.path.dirname(headers[0])])
+    environment.FastParse = True
+    files = []
+    for header in headers:
+        file = cg.SourceFile(header)
+        file.Analyze(clang_index, environment)
+        files.append(file)
+    template = templates.get_template()
+
+    start = time.perf_counter()
+    for file in files:
+        file.Render(template)
+    return sum(len(file.Enums) for file in files), time.perf_counter() - start
+
+
+def bench_end_to_end(headers: List[str], settings: dict) -> Tuple[int, float]:
+    start = time.perf_counter()
+    from codegen import batch
+
+    source_root = os.path.dirname(headers[0])
+    with tempfile.TemporaryDirectory() as output_root:
+        options = batch.BatchOptions(
+            [source_root],
+            settings['libclangpath'],
+            source_root,
+            output_root,
+            os.path.join(output_root, 'cache'),
+            jobs=settings['jobs'],
+            fast_parse=settings['fast_parse']
+        )
+        results = batch.run_batch('generate', headers, options)
+        if results.errors:
+            raise RuntimeError(batch.format_errors(results))
+    # Generation doesn't report enums, but the corpus shape determines how many there are
+    return settings['corpus_enums'], time.perf_counter() - start
+
+
+benchmarks: Dict[str, Callable] = {
+    'analyze': bench_analyze,
+    'render': bench_render,
+    'end_to_end': bench_end_to_end,
+}
+
+
+def _run_benchmark(name: str, headers: List[str], settings: dict) -> dict:
+    enums, seconds = benchmarks[name](headers, settings)
+    return {'seconds': seconds, 'enums': enums, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def run_benchmark(name: str, headers: List[str], settings: dict, repeat: int) -> dict:
+    """Runs a benchmark in fresh processes and keeps the fastest run"""
+    context = multiprocessing.get_context('spawn')
+    best = None
+    for _ in range(repeat):
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_benchmark, (name, headers, settings))
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+
+    return {
+        'seconds': best['seconds'],
+        'files_per_sec': len(headers) / best['seconds'],
+        'enums_per_sec': best['enums'] / best['seconds'],
+        'peak_rss_mb': best['peak_rss_mb'],
+    }
+
+
+def do_run(args: argparse.Namespace) -> int:
+    config = config_from_arguments(args)
+    settings = {
+        'libclangpath': args.libclangpath,
+        'fast_parse': args.fast_parse,
+        'jobs': args.jobs,
+        'corpus_enums': config.headers * config.enums,
+    }
+    selected = args.benchmark or list(benchmarks)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        headers = generate_corpus(corpus_dir, config)
+        for name in selected:
+            results[name] = run_benchmark(name, headers, settings, args.repeat)
+            print('%-12s %8.3f s %10.1f files/s %10.1f enums/s %8s MB peak' % (
+                name,
+                results[name]['seconds'],
+                results[name]['files_per_sec'],
+                results[name]['enums_per_sec'],
+                '%.1f' % results[name]['peak_rss_mb'] if results[name]['peak_rss_mb'] is not None else '-'
+            ))
+
+    report = {
+        'version': codegen.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': config.to_dict(),
+        'settings': {'fast_parse': args.fast_parse, 'jobs': args.jobs, 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Prints a comparison table, and returns descriptions of metrics that regressed by more than threshold"""
+    regressions = []
+    if baseline.get('corpus') != current.get('corpus') or baseline.get('settings') != current.get('settings'):
+        print('warning: corpus or settings differ between the reports, so results may not be comparable')
+
+    print('%-12s %-14s %12s %12s %9s' % ('benchmark', 'metric', 'baseline', 'current', 'change'))
+    for name, current_metrics in current['results'].items():
+        baseline_metrics = baseline['results'].get(name)
+        if baseline_metrics is None:
+            continue
+        for metric, current_value in current_metrics.items():
+            baseline_value = baseline_metrics.get(metric)
+            if not baseline_value or current_value is None:
+                continue
+            change = (current_value - baseline_value) / baseline_value
+            worse = -change if metric in higher_is_better else change
+            flag = ' REGRESSION' if worse > threshold else ''
+            print('%-12s %-14s %12.3f %12.3f %+8.1f%%%s' % (
+                name, metric, baseline_value, current_value, change * 100, flag))
+            if flag:
+                regressions.append('%s %s' % (name, metric))
+    return regressions
+
+
+def do_compare(args: argparse.Namespace) -> int:
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r') as f:
+        current = json.load(f)
+
+    regressions = compare_reports(baseline, current, args.threshold)
+    if regressions:
+        print('%d metric(s) regressed by more than %.0f%%' % (len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+
+def main() -> int:
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = argparser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument('--libclangpath', help='Path to libclang library file', required=True)
+    run_parser.add_argument('--output', '-o', help='File to write the results to, as JSON')
+    run_parser.add_argument('--benchmark', help='Benchmark to run; may be repeated. Defaults to all of them',
+                            choices=list(benchmarks), action='append')
+    run_parser.add_argument('--repeat', help='Number of runs per benchmark; the fastest is kept', type=int, default=3)
+    run_parser.add_argument('--fast-parse', help='Use fast parsing for analysis', action='store_true')
+    run_parser.add_argument('--jobs', '-j', help='Worker processes for the end to end run', type=int, default=1)
+    add_corpus_arguments(run_parser)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare results against a baseline')
+    compare_parser.add_argument('baseline', help='Baseline results file')
+    compare_parser.add_argument('current', help='Results file to check')
+    compare_parser.add_argument('--threshold', help='Relative change that counts as a regression', type=float,
+                                default=0.1)
+
+    args = argparser.parse_args()
+    if args.command == 'run':
+        return do_run(args)
+    return do_compare(args)
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -9,6 +9,16 @@ function(add_codegen_targets
 )
     set(cache_path "${CMAKE_CURRENT_BINARY_DIR}/codegen_cache")
 
+    # Number of worker processes used to analyze source files at configure time; 0 uses one per CPU.
+    if (NOT DEFINED CODEGEN_JOBS)
+        set(CODEGEN_JOBS 0)
+    endif()
+
+    # Number of unity source files to aggregate generated code into; 0 generates a source file per header.
+    if (NOT DEFINED CODEGEN_UNITY_CHUNKS)
+        set(CODEGEN_UNITY_CHUNKS 0)
+    endif()
+
     #
     # Find our python interpreter, and set up some python related variables.
     #
@@ -159,6 +169,50 @@ function(add_codegen_targets
             "${CODEGEN_PACKAGE}"
     )
 
+    #
+    # Tool options that have to match between configure-time and build-time invocations.
+    #
+    set(codegen_options_arguments "")
+    if (CODEGEN_FAST_PARSE)
+        # Skip function bodies and only walk declaration contexts when analyzing source files
+        list(APPEND codegen_options_arguments "--fast-parse")
+    endif()
+    foreach(prefilter_token ${CODEGEN_PREFILTER_TOKENS})
+        # Macros that expand to enum declarations, which the tool's lexical pre-filter can't see through
+        list(APPEND codegen_options_arguments "--prefilter-token" "${prefilter_token}")
+    endforeach()
+    foreach(pch_header ${CODEGEN_PCH_HEADERS})
+        # Commonly included headers that are precompiled once and shared by every analyzed source file
+        list(APPEND codegen_options_arguments "--pch-header" "${pch_header}")
+    endforeach()
+    if (CODEGEN_UNITY_CHUNKS GREATER 0)
+        # Headers generate fragments, which are included by a fixed set of unity chunks
+        list(APPEND codegen_options_arguments "--unity-chunks" "${CODEGEN_UNITY_CHUNKS}")
+    endif()
+    if (CODEGEN_AGGREGATE GREATER 1)
+        # Headers of a directory are analyzed together in one translation unit, this many at a time
+        list(APPEND codegen_options_arguments "--aggregate" "${CODEGEN_AGGREGATE}")
+    endif()
+    if (CODEGEN_STORE)
+        # Directory of analysis results and generated code shared between build trees, such as a clean build and
+        # the build of another branch of the same checkout
+        list(APPEND codegen_options_arguments "--store" "${CODEGEN_STORE}")
+        if (CODEGEN_STORE_MAX_SIZE)
+            list(APPEND codegen_options_arguments "--store-max-size" "${CODEGEN_STORE_MAX_SIZE}")
+        endif()
+    endif()
+
+    #
+    # Build-time generate steps run one per source file, so they can go through a long running server that keeps
+    # libclang and the template loaded, instead of starting the tool from scratch each time. Configure-time steps
+    # handle every source file in one invocation, so they keep running the tool directly, in parallel.
+    #
+    if (CODEGEN_SERVER AND NOT WIN32)
+        set(codegen_generate_module "codegen.client")
+    else()
+        set(codegen_generate_module "codegen")
+    endif()
+
     set(include_directories_arguments "")
     foreach(include_directory ${include_directories})
         list(APPEND include_directories_arguments "-I")
@@ -168,49 +222,139 @@ function(add_codegen_targets
     message(STATUS "Updating codegen targets")
 
     #
-    # Set up targets for all files which will be generated by the codegen tool.
+    # Cached outputs only hold for the options they were determined with. For instance, with unity chunks every source
+    # file lists a fragment, which no longer gets generated once unity chunks are turned off again. The options are
+    # recorded once the tool has run, and none of the cached outputs are used when they changed since.
     #
-    set(all_output_files "")
-    foreach(current_source_file ${source_files})
+    set(cached_options_filename "${cache_path}/codegen_options.txt")
+    set(codegen_cache_options "${include_directories_arguments};${codegen_options_arguments}")
+    set(cached_options_are_ok false)
+    if (EXISTS "${cached_options_filename}")
+        file(READ "${cached_options_filename}" cached_options)
+        if ("${cached_options}" STREQUAL "${codegen_cache_options}")
+            set(cached_options_are_ok true)
+        endif()
+    endif()
 
-        #
-        # Determine which files are generated by this source file at configure time
-        #
+    #
+    # Determine which source files have up to date cached outputs. Everything else is handed to the codegen tool in a
+    # single batched invocation, so we only pay for interpreter and libclang startup once.
+    #
+    set(uncached_source_files "")
+    foreach(current_source_file ${source_files})
         file(RELATIVE_PATH source_file_relative "${input_root}" "${current_source_file}")
         set(cached_source_outputs_filename "${cache_path}/${source_file_relative}.outputs")
         set(cached_outputs_are_ok false)
 
-        if (EXISTS "${cached_source_outputs_filename}")
+        if ("${cached_options_are_ok}" AND EXISTS "${cached_source_outputs_filename}")
             # Get the timestamp of the cache file and the source file
             file(TIMESTAMP "${cached_source_outputs_filename}" cached_outputs_timestamp "%s")
             file(TIMESTAMP "${current_source_file}" source_file_timestamp "%s")
             if (cached_outputs_timestamp GREATER source_file_timestamp)
                 # Cache hit
-                file(READ "${cached_source_outputs_filename}" current_output_files)
                 set(cached_outputs_are_ok true)
             endif()
+
+            # Headers included by the source file can change its outputs too, such as through macros
+            set(cached_dependencies_filename "${cache_path}/${source_file_relative}.deps")
+            if ("${cached_outputs_are_ok}" AND EXISTS "${cached_dependencies_filename}")
+                file(READ "${cached_dependencies_filename}" cached_dependencies)
+                string(STRIP "${cached_dependencies}" cached_dependencies)
+                foreach(dependency ${cached_dependencies})
+                    if (NOT EXISTS "${dependency}")
+                        set(cached_outputs_are_ok false)
+                        break()
+                    endif()
+                    file(TIMESTAMP "${dependency}" dependency_timestamp "%s")
+                    if (dependency_timestamp GREATER cached_outputs_timestamp)
+                        set(cached_outputs_are_ok false)
+                        break()
+                    endif()
+                endforeach()
+            endif()
         endif()
 
         if (NOT "${cached_outputs_are_ok}")
-            execute_process(
-                COMMAND
-                    "${venv_path}/${venv_python_executable_path}" "-m" "codegen"
-                    "get_output_files"
-                    "${current_source_file}"
-                    ${include_directories_arguments}
-                    "--libclangpath" "${CLANG_LIBRARY}"
-                    "--source-root" "${input_root}"
-                    "--output-root" "${output_root}"
-                    "--cache-path" "${cache_path}"
-                OUTPUT_VARIABLE current_output_files
-                RESULT_VARIABLE tool_result
-            )
-            if (NOT tool_result EQUAL 0)
-                message(SEND_ERROR "Error running codegen tool. result: ${tool_result}.")
-                continue()
-            endif()
+            list(APPEND uncached_source_files "${current_source_file}")
         endif()
+    endforeach()
 
+    list(LENGTH uncached_source_files uncached_source_files_len)
+    if (CODEGEN_UNITY_CHUNKS GREATER 0)
+        #
+        # Which fragments each chunk includes depends on every source file, so they are all handed to the tool. Files
+        # that haven't changed are served from its analysis cache.
+        #
+        set(manifest_filename "${cache_path}/write_unity_chunks.manifest")
+        string(REPLACE ";" "\n" manifest_contents "${source_files}")
+        file(WRITE "${manifest_filename}" "${manifest_contents}\n")
+
+        execute_process(
+            COMMAND
+                "${venv_path}/${venv_python_executable_path}" "-m" "codegen"
+                "write_unity_chunks"
+                "--manifest" "${manifest_filename}"
+                "--jobs" "${CODEGEN_JOBS}"
+                ${include_directories_arguments}
+                ${codegen_options_arguments}
+                "--libclangpath" "${CLANG_LIBRARY}"
+                "--source-root" "${input_root}"
+                "--output-root" "${output_root}"
+                "--cache-path" "${cache_path}"
+            OUTPUT_QUIET
+            RESULT_VARIABLE tool_result
+        )
+        if (NOT tool_result EQUAL 0)
+            message(SEND_ERROR "Error running codegen tool. result: ${tool_result}.")
+        else()
+            file(WRITE "${cached_options_filename}" "${codegen_cache_options}")
+        endif()
+    elseif (uncached_source_files_len GREATER 0)
+        #
+        # The tool writes a .outputs cache file for every source file in the manifest, which we read back below.
+        #
+        set(manifest_filename "${cache_path}/get_output_files.manifest")
+        string(REPLACE ";" "\n" manifest_contents "${uncached_source_files}")
+        file(WRITE "${manifest_filename}" "${manifest_contents}\n")
+
+        execute_process(
+            COMMAND
+                "${venv_path}/${venv_python_executable_path}" "-m" "codegen"
+                "get_output_files"
+                "--manifest" "${manifest_filename}"
+                "--jobs" "${CODEGEN_JOBS}"
+                ${include_directories_arguments}
+                ${codegen_options_arguments}
+                "--libclangpath" "${CLANG_LIBRARY}"
+                "--source-root" "${input_root}"
+                "--output-root" "${output_root}"
+                "--cache-path" "${cache_path}"
+            OUTPUT_QUIET
+            RESULT_VARIABLE tool_result
+        )
+        if (NOT tool_result EQUAL 0)
+            message(SEND_ERROR "Error running codegen tool. result: ${tool_result}.")
+        else()
+            file(WRITE "${cached_options_filename}" "${codegen_cache_options}")
+        endif()
+    endif()
+
+    #
+    # Set up targets for all files which will be generated by the codegen tool.
+    #
+    set(all_output_files "")
+    foreach(current_source_file ${source_files})
+
+        #
+        # Determine which files are generated by this source file from the cache
+        #
+        file(RELATIVE_PATH source_file_relative "${input_root}" "${current_source_file}")
+        set(cached_source_outputs_filename "${cache_path}/${source_file_relative}.outputs")
+        if (NOT EXISTS "${cached_source_outputs_filename}")
+            message(SEND_ERROR "Codegen tool did not produce outputs for ${current_source_file}.")
+            continue()
+        endif()
+        file(READ "${cached_source_outputs_filename}" current_output_files)
 
         #
         # Set up a build target for the outputs given to us by the above commands.
@@ -225,21 +369,93 @@ function(add_codegen_targets
             list(APPEND all_output_files "${current_output_file}")
         endforeach()
 
+        #
+        # The tool leaves outputs untouched when their contents don't change. Ninja restats byproducts, so there the
+        # outputs are declared as byproducts of a stamp file, and only generated files whose contents actually changed
+        # get recompiled. Other generators don't create rules for byproducts, so they keep the outputs as outputs.
+        #
+        if (CMAKE_GENERATOR MATCHES "Ninja")
+            set(stamp_file "${cache_path}/${source_file_relative}.stamp")
+            set(command_outputs_arguments OUTPUT "${stamp_file}" BYPRODUCTS "${current_output_files}")
+            set(stamp_command_arguments COMMAND "${CMAKE_COMMAND}" "-E" "touch" "${stamp_file}")
+            set(depfile_target_arguments "--depfile-target" "${stamp_file}")
+        else()
+            set(command_outputs_arguments OUTPUT "${current_output_files}")
+            set(stamp_command_arguments "")
+            set(depfile_target_arguments "")
+        endif()
+
+        #
+        # Where the generator supports depfiles, the tool lists every header the source file includes in one, so that
+        # changes to those headers regenerate it as well.
+        #
+        set(depfile_arguments "")
+        set(depfile_options_arguments "")
+        if (CMAKE_GENERATOR MATCHES "Ninja" OR NOT CMAKE_VERSION VERSION_LESS 3.20)
+            list(GET current_output_files 0 first_output_file)
+            set(depfile_arguments DEPFILE "${first_output_file}.d")
+            set(depfile_options_arguments "--depfiles" ${depfile_target_arguments})
+        endif()
+
         add_custom_command(
-            OUTPUT "${current_output_files}"
+            ${command_outputs_arguments}
+            ${depfile_arguments}
             COMMAND
-                "${venv_path}/${venv_python_executable_path}" "-m" "codegen"
+                "${venv_path}/${venv_python_executable_path}" "-m" "${codegen_generate_module}"
                 "generate"
                 "${current_source_file}"
                 ${include_directories_arguments}
+                ${codegen_options_arguments}
+                ${depfile_options_arguments}
                 "--libclangpath" "${CLANG_LIBRARY}"
                 "--source-root" "${input_root}"
                 "--output-root" "${output_root}"
+                "--cache-path" "${cache_path}"
+            ${stamp_command_arguments}
             DEPENDS "${current_source_file}" "${package_dummy}"
         )
 
     endforeach()
 
+    #
+    # In unity mode, the fragments above are only included by the chunks, which are what actually gets compiled. Each
+    # chunk also includes a pool of the names its fragments refer to, which is written again whenever one of them is.
+    #
+    if (CODEGEN_UNITY_CHUNKS GREATER 0)
+        set(unity_chunks_filename "${cache_path}/unity_chunks.outputs")
+        if (EXISTS "${unity_chunks_filename}")
+            file(READ "${unity_chunks_filename}" unity_chunk_files)
+            string(STRIP "${unity_chunk_files}" unity_chunk_files)
+            list(APPEND all_output_files ${unity_chunk_files})
+
+            foreach(unity_chunk_file ${unity_chunk_files})
+                string(REGEX REPLACE "\\.cpp$" "_names.inl" unity_chunk_names_file "${unity_chunk_file}")
+                get_filename_component(unity_chunk_names_include "${unity_chunk_names_file}" NAME)
+                file(STRINGS "${unity_chunk_file}" unity_chunk_includes REGEX "^#include \"")
+                set(unity_chunk_fragment_files "")
+                foreach(unity_chunk_include ${unity_chunk_includes})
+                    string(REGEX REPLACE "^#include \"(.*)\"$" "\\1" unity_chunk_fragment_file "${unity_chunk_include}")
+                    if (NOT unity_chunk_fragment_file STREQUAL unity_chunk_names_include)
+                        list(APPEND unity_chunk_fragment_files "${unity_chunk_fragment_file}")
+                    endif()
+                endforeach()
+
+                add_custom_command(
+                    OUTPUT
+                        "${unity_chunk_names_file}"
+                    COMMAND
+                        "${venv_path}/${venv_python_executable_path}" "-m" "codegen"
+                        "write_unity_chunk_names"
+                        "${unity_chunk_file}"
+                    DEPENDS "${unity_chunk_file}" ${unity_chunk_fragment_files} "${package_dummy}"
+                )
+                list(APPEND all_output_files "${unity_chunk_names_file}")
+            endforeach()
+        else()
+            message(SEND_ERROR "Codegen tool did not produce unity chunks.")
+        endif()
+    endif()
+
     #
     # "Return" a list of all files that will be generated during build time.
     #
@@ -1,3 +1,5 @@
 import codegen.cli
 
-exit(codegen.cli.main())
+# Guarded, since worker processes of the server import the main module again
+if __name__ == '__main__':
+    exit(codegen.cli.main())
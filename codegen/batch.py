@@ -0,0 +1,624 @@
+import atexit
+import copy
+import json
+import os
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from codegen import cache
+from codegen import codegen
+from codegen import pch
+from codegen import prefilter
+from codegen import store as result_store
+from codegen import templates
+from codegen import timing
+from codegen import unity
+from codegen.fileutil import write_depfile, write_file_if_changed
+
+
+class BatchOptions(object):
+    """Settings shared by every source file processed in a batch"""
+    def __init__(
+            self,
+            include_paths: List[str],
+            lib_clang_path: str,
+            source_root: str,
+            output_root: str,
+            cache_path: Optional[str] = None,
+            jobs: int = 1,
+            timeout: Optional[float] = None,
+            template_path: Optional[str] = None,
+            fast_parse: bool = False,
+            pch_headers: Optional[List[str]] = None,
+            prefilter: bool = True,
+            prefilter_tokens: Optional[List[str]] = None,
+            record_timings: bool = False,
+            unity_chunks: int = 0,
+            write_depfiles: bool = False,
+            depfile_target: Optional[str] = None,
+            store_path: Optional[str] = None,
+            store_max_size: Optional[int] = None,
+            aggregate_size: int = 0,
+            clang_args: Optional[List[str]] = None
+    ) -> None:
+        self.include_paths = include_paths
+        self.lib_clang_path = lib_clang_path
+        self.source_root = source_root
+        self.output_root = output_root
+        self.cache_path = cache_path
+        # Number of worker processes; 0 means one per CPU
+        self.jobs = jobs
+        # Seconds a single source file may take before it is reported as failed. Only enforced when jobs != 1.
+        self.timeout = timeout
+        # Mako template to generate code with; None uses the template that ships with codegen
+        self.template_path = template_path
+        # Whether to skip function bodies and only walk declaration contexts when parsing
+        self.fast_parse = fast_parse
+        # Headers to precompile once and use as a prefix of every parsed file
+        self.pch_headers = pch_headers or []
+        # Already built PCH of pch_headers. Set for worker processes so they don't all build their own.
+        self.precompiled_header_file: Optional[str] = None
+        # Whether to skip files without an enum keyword, and extra tokens (macros) that also mark a file as a candidate
+        self.prefilter = prefilter
+        self.prefilter_tokens = prefilter_tokens or []
+        # Whether to record per-file phase timings and counters
+        self.record_timings = record_timings
+        # Number of unity chunks to aggregate generated code into; 0 generates a source file per source file instead.
+        # In unity mode, each source file generates a fragment that is included by its chunk.
+        self.unity_chunks = unity_chunks
+        # Whether generate writes a Makefile style depfile next to each output, listing the source file and everything
+        # it includes. The depfile names the output as its target, unless another target is given (such as a stamp file
+        # that a build system tracks instead of the output).
+        self.write_depfiles = write_depfiles
+        self.depfile_target = depfile_target
+        # Store of analysis models and generated code shared between build trees, and its size cap in bytes
+        self.store_path = store_path
+        self.store_max_size = store_max_size
+        # Largest number of source files of a directory that are analyzed together in a single translation unit, so
+        # that the includes they share are parsed once; 0 or 1 parses each source file on its own
+        self.aggregate_size = aggregate_size
+        # Extra clang arguments besides include paths, such as the defines of a compile command
+        self.clang_args = clang_args or []
+
+    @property
+    def output_extension(self) -> str:
+        return unity.fragment_extension if self.unity_chunks else 'cpp'
+
+
+# Clang index of this process, created on first use
+_clang_index = None
+
+
+def _release_clang_index() -> None:
+    global _clang_index
+    _clang_index = None
+
+
+class BatchContext(object):
+    """Per-process state reused across all source files of a batch"""
+    def __init__(self, options: BatchOptions, keep_translation_units: bool = False) -> None:
+        self.options = options
+        self.analysis_cache = cache.AnalysisCache(options.cache_path) if options.cache_path else None
+        # Long running processes keep translation units around, so that files analyzed again are only reparsed
+        self.translation_units = codegen.TranslationUnitCache() if keep_translation_units else None
+        self.result_store = result_store.ResultStore(options.store_path, options.store_max_size) \
+            if options.store_path else None
+        # Source files analyzed ahead of time by an aggregate parse, waiting to be picked up by analyze()
+        self.preanalyzed: Dict[str, codegen.SourceFile] = {}
+
+    @property
+    def clang_index(self):
+        # Only load libclang once we actually have something to parse. libclang can only be loaded once per process, so
+        # the index is shared by every context, which keeps it warm for long running processes.
+        global _clang_index
+        if _clang_index is None:
+            _clang_index = codegen.CreateClangIndex(self.options.lib_clang_path)
+            # Disposed of before the interpreter tears down the bindings, which the index needs to dispose of itself
+            atexit.register(_release_clang_index)
+        return _clang_index
+
+    @property
+    def precompiled_header_file(self) -> Optional[str]:
+        options = self.options
+        if not options.pch_headers:
+            return None
+        if options.precompiled_header_file is None:
+            compile_environment = self.compile_environment
+            options.precompiled_header_file = pch.get_precompiled_header(
+                self.clang_index,
+                options.pch_headers,
+                compile_environment.GetBaseClangArgs(),
+                compile_environment.GetParseOptions(),
+                options.lib_clang_path,
+                options.cache_path
+            )
+        return options.precompiled_header_file
+
+    def use_precompiled_header(self, compile_environment: codegen.CxxCompileEnvironment) -> None:
+        precompiled_header_file = self.precompiled_header_file
+        compile_environment.PrecompiledHeaderFile = precompiled_header_file
+        compile_environment.PrecompiledHeaderIncludes = \
+            pch.get_included_files(precompiled_header_file) if precompiled_header_file else []
+
+    @property
+    def template(self):
+        return templates.get_template(self.options.template_path, self.options.cache_path)
+
+    @property
+    def compile_environment(self) -> codegen.CxxCompileEnvironment:
+        environment = codegen.CxxCompileEnvironment(self.options.include_paths)
+        environment.ExtraArgs = self.options.clang_args
+        environment.FastParse = self.options.fast_parse
+        environment.PrecompiledHeaders = self.options.pch_headers
+        environment.AggregateSize = self.options.aggregate_size
+        return environment
+
+    def can_skip(self, source_file: str) -> bool:
+        """Returns whether the source file certainly has nothing to generate code for, so it needn't be analyzed"""
+        options = self.options
+        if not options.prefilter:
+            return False
+
+        with timing.phase('prefilter', source_file):
+            skip = not self.passes_prefilter(source_file)
+        if skip:
+            timing.count('prefilter_skip')
+        return skip
+
+    def passes_prefilter(self, source_file: str) -> bool:
+        """Returns whether the source file might contain anything that one of the extractors is looking for"""
+        tokens = codegen.GetPrefilterTokens()
+        if tokens is None:
+            return True
+        return prefilter.may_contain_tokens(source_file, tokens + self.options.prefilter_tokens)
+
+    def analyze(self, source_file: str) -> codegen.SourceFile:
+        """Returns the analyzed source file, taken from the analysis cache or the shared store when available"""
+        compile_environment = self.compile_environment
+        if self.analysis_cache is None and self.result_store is None:
+            return self.parse(source_file, compile_environment)
+
+        cache_key_args = compile_environment.GetCacheKeyArgs()
+        key = cache.compute_analysis_key(source_file, cache_key_args) if self.analysis_cache else None
+        store_key = result_store.compute_model_key(source_file, cache_key_args) if self.result_store else None
+        with timing.phase('cache_load', source_file):
+            data = self.load_model(key, store_key)
+        if data is not None:
+            timing.count('analysis_cache_hit')
+            return codegen.SourceFile.FromData(source_file, data)
+
+        timing.count('analysis_cache_miss')
+        file = self.parse(source_file, compile_environment)
+        data = file.ToData()
+        data['DependencyHashes'] = cache.get_dependency_hashes(file.Includes)
+        if self.analysis_cache is not None:
+            self.analysis_cache.store(key, data)
+        if self.result_store is not None:
+            self.result_store.store_model(store_key, data)
+        return file
+
+    def load_model(self, key: Optional[str], store_key: Optional[str]) -> Optional[dict]:
+        """Loads a model from the analysis cache, falling back to the shared store. Stale models are ignored."""
+        if self.analysis_cache is not None:
+            data = self.analysis_cache.load(key)
+            if data is not None and not self.is_stale(data):
+                return data
+
+        if self.result_store is not None:
+            data = self.result_store.load_model(store_key)
+            if data is not None and not self.is_stale(data):
+                timing.count('store_hit')
+                if self.analysis_cache is not None:
+                    self.analysis_cache.store(key, data)
+                return data
+        return None
+
+    @staticmethod
+    def is_stale(data: dict) -> bool:
+        # A model is stale when a header the source file includes changed, even if the source file didn't
+        if cache.dependencies_changed(data['DependencyHashes']):
+            timing.count('analysis_cache_stale')
+            return True
+        return False
+
+    def render(self, file: codegen.SourceFile) -> str:
+        """
+        Returns the generated code for a source file, taken from the analysis cache or the shared store when available.
+        Either way, the template is only loaded when the code actually has to be rendered.
+        """
+        unity_fragment = self.options.unity_chunks > 0
+        if self.analysis_cache is None and self.result_store is None:
+            return file.Render(self.template, unity_fragment)
+
+        key = result_store.compute_output_key(
+            file.ToData(), templates.get_template_hash(self.options.template_path, codegen.GetTemplateSections()),
+            file.FilePath, unity_fragment)
+        if self.analysis_cache is not None:
+            text = self.analysis_cache.load_output(key)
+            if text is not None:
+                timing.count('output_cache_hit')
+                return text
+
+        text = self.result_store.load_output(key) if self.result_store is not None else None
+        if text is not None:
+            timing.count('store_output_hit')
+        else:
+            text = file.Render(self.template, unity_fragment)
+            if self.result_store is not None:
+                self.result_store.store_output(key, text)
+        if self.analysis_cache is not None:
+            self.analysis_cache.store_output(key, text)
+        return text
+
+    def needs_parse(self, source_file: str) -> bool:
+        """Returns whether analyzing a source file would parse it. Doesn't count towards cache statistics."""
+        options = self.options
+        if options.prefilter and not self.passes_prefilter(source_file):
+            return False
+
+        cache_key_args = self.compile_environment.GetCacheKeyArgs()
+        if self.analysis_cache is not None:
+            data = self.analysis_cache.load(cache.compute_analysis_key(source_file, cache_key_args))
+            if data is not None and not cache.dependencies_changed(data['DependencyHashes']):
+                return False
+        if self.result_store is not None:
+            return not self.result_store.contains(result_store.compute_model_key(source_file, cache_key_args), 'model')
+        return True
+
+    def analyze_aggregate(self, source_files: List[str]) -> None:
+        """
+        Parses the source files that need it in a single translation unit, for analyze() to pick up. Any that the
+        aggregate parse can't vouch for, such as ones that an error may have affected, are left to be parsed on their
+        own instead.
+        """
+        try:
+            pending = [source_file for source_file in dict.fromkeys(source_files) if self.needs_parse(source_file)]
+            if len(pending) < 2:
+                return
+            compile_environment = self.compile_environment
+            self.use_precompiled_header(compile_environment)
+            files = codegen.AnalyzeAggregate(self.clang_index, pending, compile_environment)
+        except Exception:
+            # Parsing the files one by one reports the error against the file it belongs to
+            return
+
+        timing.count('aggregate_parsed', len(files))
+        timing.count('aggregate_fallback', len(pending) - len(files))
+        self.preanalyzed.update(files)
+
+    def parse(self, source_file: str, compile_environment: codegen.CxxCompileEnvironment) -> codegen.SourceFile:
+        file = self.preanalyzed.pop(source_file, None)
+        if file is not None:
+            return file
+
+        self.use_precompiled_header(compile_environment)
+        file = codegen.SourceFile(source_file)
+        file.Analyze(self.clang_index, compile_environment, self.translation_units)
+        return file
+
+
+class FileResult(object):
+    """Result of running a command for one source file"""
+    def __init__(
+            self,
+            output_files: Optional[List[str]] = None,
+            changed_files: Optional[List[str]] = None,
+            error: Optional[str] = None,
+            skipped: bool = False,
+            timings: Optional[timing.Timings] = None,
+            dependencies: Optional[List[str]] = None
+    ) -> None:
+        self.output_files = output_files or []
+        # Outputs whose contents were actually (re)written
+        self.changed_files = changed_files or []
+        self.error = error
+        # Whether the file was skipped by the pre-filter without being analyzed
+        self.skipped = skipped
+        self.timings = timings
+        # Files included by the source file, which affect its outputs as well
+        self.dependencies = dependencies or []
+
+
+class BatchResults(object):
+    """Outputs of every successfully processed source file, and errors for the ones that failed; both in input order"""
+    def __init__(self) -> None:
+        self.outputs: Dict[str, List[str]] = {}
+        self.changed: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self.skipped = 0
+        self.timings = timing.Timings()
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """Reads a list of source files from a manifest file containing one path per line"""
+    with open(manifest_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def get_output_files_for(context: BatchContext, source_file: str) -> FileResult:
+    options = context.options
+    skipped = context.can_skip(source_file)
+    if skipped:
+        output_files = []
+        dependencies = []
+    else:
+        file = context.analyze(source_file)
+        output_files = codegen.get_source_file_outputs(file, options.source_root, options.output_root,
+                                                       options.output_extension)
+        dependencies = file.Includes
+
+    if options.cache_path:
+        codegen.cache_output_files(options.cache_path, options.source_root, source_file, output_files)
+        codegen.cache_output_dependencies(options.cache_path, options.source_root, source_file, dependencies)
+    return FileResult(output_files, skipped=skipped, dependencies=dependencies)
+
+
+def generate_for(context: BatchContext, source_file: str) -> FileResult:
+    options = context.options
+    if context.can_skip(source_file):
+        return FileResult(skipped=True)
+
+    file = context.analyze(source_file)
+    output_files = codegen.get_source_file_outputs(file, options.source_root, options.output_root,
+                                                   options.output_extension)
+    changed_files = []
+    for output_path in output_files:
+        text = context.render(file)
+        with timing.phase('write', source_file):
+            if write_file_if_changed(output_path, text):
+                changed_files.append(output_path)
+    if options.write_depfiles:
+        for output_path in output_files:
+            write_depfile(output_path + '.d', options.depfile_target or output_path, [source_file] + file.Includes)
+    return FileResult(output_files, changed_files, dependencies=file.Includes)
+
+
+batch_commands = {
+    'get_output_files': get_output_files_for,
+    'generate': generate_for,
+    'write_unity_chunks': get_output_files_for,
+}
+
+
+def group_source_files(source_files: List[str], group_size: int) -> List[List[str]]:
+    """
+    Splits source files into groups to analyze together. Groups only hold source files of the same directory, since
+    those tend to share includes, and are at most group_size long. Each source file gets its own group when group_size
+    is 0 or 1.
+    """
+    if group_size <= 1:
+        return [[source_file] for source_file in source_files]
+
+    groups: List[List[str]] = []
+    directory_groups: Dict[str, List[str]] = {}
+    for source_file in source_files:
+        directory = os.path.dirname(os.path.abspath(source_file))
+        group = directory_groups.get(directory)
+        if group is None or len(group) >= group_size:
+            group = directory_groups[directory] = []
+            groups.append(group)
+        group.append(source_file)
+    return groups
+
+
+def run_group(context: BatchContext, command: str, source_files: List[str]) -> List[FileResult]:
+    """
+    Runs a command for a group of source files, analyzing them in one aggregate parse first. Timings of the aggregate
+    parse are reported along with the first file of the group.
+    """
+    timings = timing.Timings() if context.options.record_timings else None
+    if len(source_files) > 1:
+        with timing.recording(timings):
+            context.analyze_aggregate(source_files)
+
+    results = [run_file(context, command, source_file) for source_file in source_files]
+    if context.result_store is not None:
+        context.result_store.flush_stats()
+    if timings is not None:
+        results[0].timings.merge(timings)
+    return results
+
+
+def run_file(context: BatchContext, command: str, source_file: str) -> FileResult:
+    """Runs a command for a single file, turning any failure into an error message so it can't take down the batch"""
+    timings = timing.Timings() if context.options.record_timings else None
+    with timing.recording(timings), timing.phase('file', source_file):
+        try:
+            result = batch_commands[command](context, source_file)
+        except Exception:
+            result = FileResult(error=traceback.format_exc())
+    result.timings = timings
+    return result
+
+
+# Seconds between checks of whether the worker running the group being waited for is still alive
+worker_check_interval = 0.5
+
+# Contexts of a worker process, one per batch it runs groups of
+_worker_contexts: List[BatchContext] = []
+
+# Process ID of the worker that picked up each group, shared by every worker of the pool; 0 until a worker picks it up
+_worker_pids = None
+
+
+def _init_worker(options_list: List[BatchOptions], worker_pids) -> None:
+    global _worker_contexts, _worker_pids
+    _worker_contexts = [BatchContext(options) for options in options_list]
+    _worker_pids = worker_pids
+
+
+def _run_worker_group(command: str, group_index: int, batch_index: int, source_files: List[str]) -> List[FileResult]:
+    _worker_pids[group_index] = os.getpid()
+    return run_group(_worker_contexts[batch_index], command, source_files)
+
+
+class WorkerDiedError(Exception):
+    """The worker process running a group exited before finishing it, such as from libclang crashing on a file"""
+
+
+def _wait_for_group(async_result, worker_pids, group_index: int, timeout: Optional[float]) -> List[FileResult]:
+    """
+    Waits for the results of a group. The pool replaces workers that die, but the group a worker was running when it
+    died never finishes, so this keeps checking that its worker is still alive.
+    """
+    import multiprocessing
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        wait = worker_check_interval if deadline is None else min(worker_check_interval, deadline - time.monotonic())
+        try:
+            return async_result.get(max(wait, 0))
+        except multiprocessing.TimeoutError:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise
+
+        pid = worker_pids[group_index]
+        if pid and pid not in {process.pid for process in multiprocessing.active_children()} \
+                and not async_result.ready():
+            raise WorkerDiedError()
+
+
+def run_batch(command: str, source_files: List[str], options: BatchOptions) -> BatchResults:
+    """
+    Runs a command for every source file. With more than one job the files are spread across worker processes,
+    each of which keeps its own clang index. Results are always reported in input order, regardless of the job count.
+    """
+    return run_batches(command, [(options, source_files)])
+
+
+def run_batches(command: str, batches: List[Tuple[BatchOptions, List[str]]]) -> BatchResults:
+    """
+    Runs a command for several batches of source files that each have their own options, such as their own include
+    paths, on one shared set of worker processes. The job count and timeout of the first batch apply to all of them.
+    """
+    if not batches:
+        return BatchResults()
+    jobs_options = batches[0][0]
+    groups = [(batch_index, group) for batch_index, (options, source_files) in enumerate(batches)
+              for group in group_source_files(source_files, options.aggregate_size)]
+    jobs = jobs_options.jobs if jobs_options.jobs > 0 else os.cpu_count() or 1
+    jobs = min(jobs, len(groups))
+    timeout = jobs_options.timeout
+    all_source_files = [source_file for _, source_files in batches for source_file in source_files]
+
+    results = BatchResults()
+    file_results: Dict[str, FileResult] = {}
+    if jobs <= 1:
+        contexts = [BatchContext(options) for options, _ in batches]
+        for batch_index, group in groups:
+            file_results.update(zip(group, run_group(contexts[batch_index], command, group)))
+        _add_results(results, all_source_files, file_results)
+        return results
+
+    options_list = []
+    for options, _ in batches:
+        if options.pch_headers and options.precompiled_header_file is None:
+            # Build the precompiled header up front, so the workers can share it instead of each building their own
+            options = copy.copy(options)
+            options.precompiled_header_file = BatchContext(options).precompiled_header_file
+        options_list.append(options)
+
+    file_results, failed_groups = _run_pool(command, groups, options_list, jobs, timeout)
+    if failed_groups:
+        # A group that timed out or crashed its worker may have failed because of a single file, and an aggregate parse
+        # fails along with any of its files. Try each file of the group again on its own, so only the files that fail
+        # by themselves are reported.
+        retry_groups = [(batch_index, [source_file]) for batch_index, group in failed_groups for source_file in group]
+        retry_results, _ = _run_pool(command, retry_groups, options_list, min(jobs, len(retry_groups)), timeout)
+        file_results.update(retry_results)
+    _add_results(results, all_source_files, file_results)
+    return results
+
+
+def _run_pool(command: str, groups: List[Tuple[int, List[str]]], options_list: List[BatchOptions], jobs: int,
+              timeout: Optional[float]) -> Tuple[Dict[str, FileResult], List[Tuple[int, List[str]]]]:
+    """
+    Runs groups of source files on a new pool of worker processes. Returns the results by source file, along with the
+    groups of several files that timed out or whose worker died, which have no results.
+    """
+    # Only imported when workers are actually needed, since it's slow to import and most invocations are single files
+    import multiprocessing
+    worker_pids = multiprocessing.Array('i', len(groups), lock=False)
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(options_list, worker_pids))
+    pending = [(batch_index, group, pool.apply_async(_run_worker_group, (command, group_index, batch_index, group)))
+               for group_index, (batch_index, group) in enumerate(groups)]
+
+    # Groups are dispatched in order, so by the time the previous group has been collected, the current one has
+    # started. Waiting up to the timeout from that point on therefore never cuts a group short.
+    file_results: Dict[str, FileResult] = {}
+    failed_groups: List[Tuple[int, List[str]]] = []
+    abandoned = False
+    for group_index, (batch_index, group, async_result) in enumerate(pending):
+        failed = False
+        try:
+            group_results = _wait_for_group(async_result, worker_pids, group_index,
+                                            timeout * len(group) if timeout else None)
+        except multiprocessing.TimeoutError:
+            abandoned = failed = True
+            group_results = [FileResult(error='Timed out after %s seconds\n' % timeout) for _ in group]
+        except WorkerDiedError:
+            abandoned = failed = True
+            group_results = [FileResult(error='Worker process died while processing this file\n') for _ in group]
+        except Exception:
+            group_results = [FileResult(error=traceback.format_exc()) for _ in group]
+
+        if failed and len(group) > 1:
+            failed_groups.append((batch_index, group))
+        else:
+            file_results.update(zip(group, group_results))
+
+    # Workers stuck on a timed out file would never finish, and the pool waits for the groups of dead workers forever,
+    # so neither can be joined
+    if abandoned:
+        pool.terminate()
+    else:
+        pool.close()
+    pool.join()
+    return file_results, failed_groups
+
+
+def _add_results(results: BatchResults, source_files: List[str], file_results: Dict[str, FileResult]) -> None:
+    for source_file in dict.fromkeys(source_files):
+        _add_result(results, source_file, file_results[source_file])
+
+
+def _add_result(results: BatchResults, source_file: str, result: FileResult) -> None:
+    if result.timings is not None:
+        results.timings.merge(result.timings)
+    if result.error is not None:
+        results.errors[source_file] = result.error
+    else:
+        results.outputs[source_file] = result.output_files
+        results.changed.extend(result.changed_files)
+        if result.skipped:
+            results.skipped += 1
+
+
+def get_unity_chunks_cache_filename(cache_path: str) -> str:
+    return os.path.join(cache_path, 'unity_chunks.outputs')
+
+
+def write_unity_chunks(results: BatchResults, options: BatchOptions) -> Dict[str, List[str]]:
+    """
+    Writes the unity chunk files for the fragments of a batch that covers every source file, and returns the fragments
+    included by each chunk. With a cache path, the list of chunk files is also cached for build systems to read.
+    """
+    chunk_files = unity.get_chunk_files(options.output_root, options.unity_chunks)
+    results.changed.extend(
+        unity.write_chunks(results.outputs, options.source_root, options.output_root, options.unity_chunks))
+
+    if options.cache_path:
+        os.makedirs(options.cache_path, exist_ok=True)
+        with open(get_unity_chunks_cache_filename(options.cache_path), 'w') as f:
+            f.write(';'.join(chunk_files))
+
+    chunks = unity.group_fragments(results.outputs, options.source_root, options.unity_chunks)
+    return {chunk_file: sorted(fragment_files) for chunk_file, fragment_files in zip(chunk_files, chunks)}
+
+
+def format_results(results: BatchResults) -> str:
+    return json.dumps(results.outputs, indent=2)
+
+
+def format_errors(results: BatchResults) -> str:
+    return ''.join('Error processing %s:\n%s' % (source_file, error) for source_file, error in results.errors.items())
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import codegen
+from codegen.fileutil import write_file_atomic
+
+# Bump whenever the layout of serialized analysis models changes
+ModelFormatVersion = 3
+
+# Hashes of files hashed by this process, along with the mtime and size they were hashed at
+_file_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def hash_file(file_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def hash_file_cached(file_path: str) -> Optional[str]:
+    """
+    Returns the hash of a file, only hashing it again when its mtime or size changed since this process last hashed
+    it. Returns None if the file doesn't exist anymore.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_hashes.get(file_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    file_hash = hash_file(file_path)
+    _file_hashes[file_path] = (stamp, file_hash)
+    return file_hash
+
+
+def get_dependency_hashes(file_paths: Iterable[str]) -> Dict[str, Optional[str]]:
+    return {file_path: hash_file_cached(file_path) for file_path in file_paths}
+
+
+def dependencies_changed(dependency_hashes: Dict[str, Optional[str]]) -> bool:
+    """Returns whether any of the files that an analysis model was built from changed since it was built"""
+    return any(hash_file_cached(file_path) != file_hash for file_path, file_hash in dependency_hashes.items())
+
+
+def compute_analysis_key(file_path: str, clang_args: Iterable[str]) -> str:
+    """
+    Returns the key of a source file's analysis model. It covers the file contents, the arguments clang parses it with,
+    and the version of the tool doing the analysis. It also covers the directory of the file, because quoted includes
+    are resolved relative to it, so identical files in different directories can include different headers. Headers the
+    file includes are validated separately when a model is loaded, against the hashes stored along with it.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(('%s;%d\n' % (codegen.__version__, ModelFormatVersion)).encode('utf-8'))
+    hasher.update('\0'.join(clang_args).encode('utf-8'))
+    hasher.update(b'\n')
+    hasher.update(os.path.dirname(os.path.normpath(os.path.abspath(file_path))).encode('utf-8'))
+    hasher.update(b'\n')
+    hasher.update(hash_file(file_path).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class AnalysisCache(object):
+    """
+    Stores analysis models of source files in a cache directory, addressed by their analysis key. Generated code is
+    kept as well, addressed by its output key, so that regenerating from an unchanged model doesn't need the template.
+    """
+    def __init__(self, cache_path: str) -> None:
+        self.directory = os.path.join(cache_path, 'models')
+        self.outputs_directory = os.path.join(cache_path, 'outputs')
+
+    def get_filename(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get_output_filename(self, key: str) -> str:
+        return os.path.join(self.outputs_directory, key[:2], key + '.txt')
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.get_filename(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, data: dict) -> None:
+        filename = self.get_filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        write_file_atomic(filename, json.dumps(data))
+
+    def load_output(self, key: str) -> Optional[str]:
+        try:
+            with open(self.get_output_filename(key), 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_output(self, key: str, text: str) -> None:
+        filename = self.get_output_filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        write_file_atomic(filename, text)
@@ -1,8 +1,11 @@
 import sys
 import argparse
-from typing import List
+import os
+from typing import List, Optional
 
+from codegen import batch
 from codegen import codegen
+from codegen import store
 
 
 class ArgumentData(object):
@@ -14,46 +17,289 @@ class ArgumentData(object):
         self.source_root = ''
         self.output_root = ''
         self.cache_path = None
+        self.manifest = None
+        self.jobs = 1
+        self.timeout = None
+        self.template = None
+        self.changed_outputs = None
+        self.fast_parse = False
+        self.pch_headers: List[str] = []
+        self.prefilter = True
+        self.prefilter_tokens: List[str] = []
+        self.profile = None
+        self.timings = None
+        self.trace = None
+        self.unity_chunks = 0
+        self.poll = False
+        self.depfiles = False
+        self.depfile_target = None
+        self.poll_interval = 0.5
+        self.store = None
+        self.store_max_size = None
+        self.aggregate = 0
+        self.socket = None
+        self.idle_timeout = 600.0
+        self.stop = False
+        self.compile_commands = None
+        self.output_manifest = None
 
 
-argparser = argparse.ArgumentParser()
-argparser.add_argument('command', help='What to do')
-argparser.add_argument('source_file', help='Source file to use')
-argparser.add_argument('--libclangpath', help='Path to libclang library file', required=True)
+argparser = argparse.ArgumentParser(fromfile_prefix_chars='@')
+argparser.add_argument('command', help='What to do: get_output_files, generate, write_unity_chunks, '
+                                      'write_unity_chunk_names, watch, scan, serve or stats')
+argparser.add_argument('source_file', help='Source file to use, or the unity chunk for write_unity_chunk_names',
+                       nargs='?', default='')
+argparser.add_argument('--libclangpath', help='Path to libclang library file')
 argparser.add_argument('--include', '-I', help='Define an include path', dest='include_paths', action='append')
-argparser.add_argument('--source-root', help='Root path of all source files', required=True)
-argparser.add_argument('--output-root', help='Root path of all files to be output', required=True)
+argparser.add_argument('--source-root', help='Root path of all source files')
+argparser.add_argument('--output-root', help='Root path of all files to be output')
 argparser.add_argument('--cache-path', help='Path to a directory to store output file caches in')
+argparser.add_argument('--manifest', help='File listing source files to process, one per line. '
+                                          'Results are written to stdout as a JSON map of source file to outputs')
+argparser.add_argument('--jobs', '-j', help='Number of worker processes to use with --manifest; 0 uses one per CPU',
+                       type=int, default=1)
+argparser.add_argument('--timeout', help='Seconds a single source file may take with --jobs before it is failed',
+                       type=float)
+argparser.add_argument('--template', help='Mako template to generate code with, instead of the built-in one')
+argparser.add_argument('--fast-parse', help='Skip function bodies and only walk declaration contexts when parsing',
+                       action='store_true')
+argparser.add_argument('--pch-header', help='Commonly included header to precompile once and reuse for every source '
+                                            'file of a run', dest='pch_headers', action='append')
+argparser.add_argument('--no-prefilter', help="Analyze every source file, even if it doesn't contain the enum keyword",
+                       dest='prefilter', action='store_false')
+argparser.add_argument('--prefilter-token', help='Name of a macro that expands to an enum declaration; files using it '
+                                                 'are always analyzed', dest='prefilter_tokens', action='append')
+argparser.add_argument('--changed-outputs', help='File to write the outputs whose contents changed to, one per line')
+argparser.add_argument('--profile', help='Run under cProfile, and write the stats to the given file or print them. '
+                                         'Only covers the main process, so combine with --jobs 1',
+                       nargs='?', const='')
+argparser.add_argument('--timings', help='File to write per-file phase timings and cache counters to, as JSON')
+argparser.add_argument('--trace', help='File to write phase timings to in the Chrome trace event format')
+argparser.add_argument('--unity-chunks', help='Aggregate generated code into this many unity source files. Each source '
+                                              'file then generates a fragment that its chunk includes',
+                       type=int, default=0)
+argparser.add_argument('--depfiles', help='Write a Makefile style depfile next to each generated file, listing the '
+                                          'source file and every header it includes', action='store_true')
+argparser.add_argument('--depfile-target', help='Target to name in depfiles instead of the generated file, such as a '
+                                                'stamp file that the build system tracks')
+argparser.add_argument('--poll', help='Make watch poll for changes, rather than using inotify', action='store_true')
+argparser.add_argument('--poll-interval', help='Seconds between scans when watch polls for changes', type=float,
+                       default=0.5)
+argparser.add_argument('--store', help='Directory of a store of analysis results and generated code that is shared '
+                                       'between build trees, on top of the per-tree cache')
+argparser.add_argument('--store-max-size', help='Size cap of the store, such as 500M or 2G. The least recently used '
+                                                'entries are evicted beyond it. The store keeps the last cap it was '
+                                                'given, which starts out at 1G', type=store.parse_size)
+argparser.add_argument('--aggregate', help='Analyze up to this many source files of a directory in a single '
+                                           'translation unit, so the includes they share are only parsed once. Source '
+                                           'files that hit errors are analyzed on their own instead',
+                       type=int, default=0)
+argparser.add_argument('--socket', help='Unix domain socket of the server that serve runs and codegen.client talks to. '
+                                        'Defaults to one per user and python environment')
+argparser.add_argument('--idle-timeout', help='Seconds without requests after which serve shuts down', type=float,
+                       default=600.0)
+argparser.add_argument('--stop', help='Make serve stop the running server instead', action='store_true')
+argparser.add_argument('--compile-commands', help='compile_commands.json, or the build directory containing it, that '
+                                                  'scan takes include paths and defines from')
+argparser.add_argument('--output-manifest', help='File to write every output of a scan to, one per line')
 
 
-def main() -> int:
+def main(argv: Optional[List[str]] = None) -> int:
     args = ArgumentData()
 
     # noinspection PyTypeChecker
-    argparser.parse_args(namespace=args)
+    argparser.parse_args(argv, namespace=args)
 
+    if args.command.lower() == 'stats':
+        return do_stats_command(args)
+    if args.command.lower() == 'serve':
+        return do_serve_command(args)
+    if args.command.lower() == 'write_unity_chunk_names':
+        return do_write_unity_chunk_names_command(args)
+
+    if not args.libclangpath or not args.source_root or not args.output_root:
+        sys.stderr.write('--libclangpath, --source-root and --output-root are required\n')
+        return 1
+
+    if not args.source_file and not args.manifest and args.command.lower() not in ('watch', 'scan'):
+        sys.stderr.write('No source file or manifest given\n')
+        return 1
+
+    if args.profile is not None or codegen.EnableProfiling:
+        return run_profiled(args)
+    return run_command(args)
+
+
+def run_profiled(args: ArgumentData) -> int:
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(run_command, args)
+    if args.profile:
+        profiler.dump_stats(args.profile)
+    else:
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(40)
+    return result
+
+
+def run_command(args: ArgumentData) -> int:
     if args.command.lower() == 'get_output_files':
         return do_get_output_files_command(args)
     if args.command.lower() == 'generate':
         return do_generate_command(args)
+    if args.command.lower() == 'write_unity_chunks':
+        return do_write_unity_chunks_command(args)
+    if args.command.lower() == 'watch':
+        return do_watch_command(args)
+    if args.command.lower() == 'scan':
+        return do_scan_command(args)
 
     sys.stderr.write('Invalid Command\n')
     return 1
 
 
-def do_get_output_files_command(args: ArgumentData) -> int:
-    output_files = codegen.get_output_files(
-        args.source_file,
+def make_batch_options(args: ArgumentData) -> batch.BatchOptions:
+    return batch.BatchOptions(
         args.include_paths,
         args.libclangpath,
         args.source_root,
         args.output_root,
-        args.cache_path
+        args.cache_path,
+        args.jobs,
+        args.timeout,
+        args.template,
+        args.fast_parse,
+        args.pch_headers,
+        args.prefilter,
+        args.prefilter_tokens,
+        bool(args.timings or args.trace),
+        args.unity_chunks,
+        args.depfiles,
+        args.depfile_target,
+        args.store,
+        args.store_max_size,
+        args.aggregate
     )
-    sys.stdout.write(';'.join(output_files))
+
+
+def write_reports(args: ArgumentData, results: batch.BatchResults) -> None:
+    if args.changed_outputs:
+        with open(args.changed_outputs, 'w') as f:
+            f.writelines(output_file + '\n' for output_file in results.changed)
+    if args.timings:
+        results.timings.write_summary(args.timings)
+    if args.trace:
+        results.timings.write_trace(args.trace)
+
+
+def do_batch_command(args: ArgumentData) -> int:
+    source_files = batch.read_manifest(args.manifest)
+    options = make_batch_options(args)
+    results = batch.run_batch(args.command.lower(), source_files, options)
+    return report_batch_results(args, args.command.lower(), options, results, len(source_files))
+
+
+def report_batch_results(args: ArgumentData, command: str, options: batch.BatchOptions, results: batch.BatchResults,
+                         source_count: int) -> int:
+    if options.unity_chunks and not results.errors and command != 'get_output_files':
+        # A manifest covers every source file, so the chunks can be written as well
+        chunks = batch.write_unity_chunks(results, options)
+        if command == 'write_unity_chunks':
+            results.outputs = chunks
+    sys.stdout.write(batch.format_results(results))
+    write_reports(args, results)
+    if results.skipped:
+        sys.stderr.write('Pre-filter skipped %d of %d source files\n' % (results.skipped, source_count))
+    if results.errors:
+        sys.stderr.write(batch.format_errors(results))
+        return 1
     return 0
 
 
+def do_get_output_files_command(args: ArgumentData) -> int:
+    if args.manifest:
+        return do_batch_command(args)
+    return do_single_file_command(args)
+
+
 def do_generate_command(args: ArgumentData) -> int:
-    codegen.RunCodegen(args.source_file, args.include_paths, args.libclangpath, args.source_root, args.output_root)
+    if args.manifest:
+        return do_batch_command(args)
+    return do_single_file_command(args)
+
+
+def do_write_unity_chunks_command(args: ArgumentData) -> int:
+    if not args.manifest or args.unity_chunks <= 0:
+        sys.stderr.write('write_unity_chunks needs a manifest of every source file, and --unity-chunks\n')
+        return 1
+    return do_batch_command(args)
+
+
+def do_write_unity_chunk_names_command(args: ArgumentData) -> int:
+    from codegen import unity
+    if not args.source_file:
+        sys.stderr.write('write_unity_chunk_names needs the unity chunk to write the name pool of\n')
+        return 1
+    unity.write_chunk_names(args.source_file)
+    return 0
+
+
+def do_watch_command(args: ArgumentData) -> int:
+    from codegen import watch
+    # Without a manifest, every header under the source root is watched
+    source_files = batch.read_manifest(args.manifest) if args.manifest else None
+    return watch.run_watch(source_files, make_batch_options(args), args.poll, args.poll_interval)
+
+
+def do_scan_command(args: ArgumentData) -> int:
+    from codegen import scan
+    from codegen import watch
+
+    if not args.compile_commands:
+        sys.stderr.write('scan needs --compile-commands\n')
+        return 1
+
+    # Every header of the project, unless a manifest narrows it down
+    if args.manifest:
+        source_files = batch.read_manifest(args.manifest)
+    else:
+        source_files = watch.find_source_files(args.source_root, args.output_root)
+    options = make_batch_options(args)
+    results = scan.run_scan('generate', source_files, args.compile_commands, options)
+    if args.output_manifest:
+        with open(args.output_manifest, 'w') as f:
+            f.writelines(output_file + '\n' for outputs in results.outputs.values() for output_file in outputs)
+    return report_batch_results(args, 'generate', options, results, len(source_files))
+
+
+def do_stats_command(args: ArgumentData) -> int:
+    if not args.store:
+        sys.stderr.write('stats needs --store\n')
+        return 1
+    if not os.path.isdir(args.store):
+        # Opening the store would create it
+        sys.stdout.write('No store at %s\n' % args.store)
+        return 0
+    sys.stdout.write(store.ResultStore(args.store, args.store_max_size).format_stats())
+    return 0
+
+
+def do_serve_command(args: ArgumentData) -> int:
+    from codegen import client
+    from codegen import server
+    socket_path = args.socket or client.get_socket_path()
+    if args.stop:
+        return 0 if client.stop_server(socket_path) else 1
+    return server.run_server(socket_path, args.jobs, args.idle_timeout)
+
+
+def do_single_file_command(args: ArgumentData) -> int:
+    results = batch.run_batch(args.command.lower(), [args.source_file], make_batch_options(args))
+    write_reports(args, results)
+    if results.errors:
+        sys.stderr.write(batch.format_errors(results))
+        return 1
+    if args.command.lower() == 'get_output_files':
+        sys.stdout.write(';'.join(results.outputs[args.source_file]))
     return 0
@@ -0,0 +1,114 @@
+"""
+Thin client of the codegen server. Takes the same arguments as the command line tool, and has the server run them:
+
+    python -m codegen.client generate Foo.h --libclangpath ... --source-root ... --output-root ...
+
+A server is started in the background if none is running, and the command runs in-process if one can't be reached.
+Only the standard library is imported up front, so each call costs little more than starting the interpreter.
+"""
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import codegen
+
+# Seconds to wait for a server that was just started to accept connections
+start_timeout = 10.0
+
+
+def get_socket_path() -> str:
+    """
+    Returns the socket of the server to use. There is one server per user and python environment by default, since a
+    server runs the codegen package of the interpreter that started it. CODEGEN_SOCKET overrides it.
+    """
+    socket_path = os.environ.get('CODEGEN_SOCKET')
+    if socket_path:
+        return socket_path
+
+    key = hashlib.sha256(('%s\n%s' % (sys.executable, codegen.__version__)).encode('utf-8')).hexdigest()[:12]
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', '')
+    return os.path.join(tempfile.gettempdir(), 'codegen-%s-%s.sock' % (user, key))
+
+
+def send_message(connection: socket.socket, message: dict) -> None:
+    connection.sendall(json.dumps(message).encode('utf-8'))
+    connection.shutdown(socket.SHUT_WR)
+
+
+def receive_message(connection: socket.socket) -> dict:
+    chunks = []
+    while True:
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def send_request(socket_path: str, request: dict) -> Optional[dict]:
+    """Sends a request to the server and returns its response, or None if no server answered it"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        send_message(connection, request)
+        return receive_message(connection)
+    except (OSError, ValueError):
+        # No server, or one that went away before answering, such as when shutting down
+        return None
+    finally:
+        connection.close()
+
+
+def start_server(socket_path: str) -> None:
+    """Starts a server in the background, detached from this process so it outlives it"""
+    command = [sys.executable, '-m', 'codegen', 'serve', '--socket', socket_path]
+    options = {'start_new_session': True} if os.name == 'posix' else {}
+    subprocess.Popen(command, cwd=os.path.abspath(os.sep), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, close_fds=True, **options)
+
+
+def run(argv: List[str], socket_path: Optional[str] = None) -> Optional[dict]:
+    """Has the server run a command, starting one if needed. Returns None if no server could be reached."""
+    socket_path = socket_path or get_socket_path()
+    request = {'argv': argv, 'cwd': os.getcwd()}
+    response = send_request(socket_path, request)
+    if response is not None or not hasattr(socket, 'AF_UNIX'):
+        return response
+
+    start_server(socket_path)
+    deadline = time.monotonic() + start_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        response = send_request(socket_path, request)
+        if response is not None:
+            return response
+    return None
+
+
+def stop_server(socket_path: Optional[str] = None) -> bool:
+    """Asks the server to shut down. Returns whether one was running."""
+    return send_request(socket_path or get_socket_path(), {'stop': True}) is not None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    response = run(argv)
+    if response is None:
+        from codegen import cli
+        return cli.main(argv)
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['returncode']
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -1,15 +1,19 @@
 # C++ code generation using clang
-import clang.cindex
-import cProfile
-import mako.template
+# clang.cindex is imported by the functions that use it, so that runs which only hit caches never import it
+import hashlib
 import os
+import re
 
 from typing import List, Iterable, Optional
 
+from codegen import templates
+from codegen import timing
+from codegen.fileutil import write_file_if_changed
+
 # Directory that the codegen script file is stored in
 TemplateDir = os.path.normpath(os.path.join(os.path.dirname(__file__), 'data'))
 
-# [debug] Whether to enable profiling
+# [debug] Whether to run the command line tool under cProfile, as if --profile was given
 EnableProfiling = False
 
 # [debug] Whether to print the AST for each processed source file
@@ -33,9 +37,13 @@ InputViaCommandLine = True
 # Whether to always do a full regen
 ForceFullRegen = False
 
+# Largest size of a dense value to name table, relative to the number of names it holds
+DenseTableMaxSizeRatio = 2
+
 
 def GetCursorFullyQualifiedName(Cursor):
 	""" Return the fully qualified name of the object represented by Cursor, including any parent scopes """
+	import clang.cindex
 	OutName = Cursor.spelling
 	Cursor = Cursor.semantic_parent
 		
@@ -46,8 +54,13 @@ def GetCursorFullyQualifiedName(Cursor):
 			
 	return OutName
 	
+def WrapToInt32(Value):
+	""" Returns Value converted to a 32-bit signed int the way a C++ cast would, such as for unsigned enum values """
+	return (Value + 2**31) % 2**32 - 2**31
+	
 def GetCursorAnnotations(Cursor):
 	""" Return all annotation strings assigned to this cursor """
+	import clang.cindex
 	return [Child.displayname for Child in Cursor.get_children() if Child.kind is clang.cindex.CursorKind.ANNOTATE_ATTR]
 	
 def DebugPrintCursorRecursive(Cursor, SourceFile, Depth=0):
@@ -61,6 +74,24 @@ def DebugPrintCursorRecursive(Cursor, SourceFile, Depth=0):
 		if c.location.file and SourceFile in c.location.file.name:
 			DebugPrintCursorRecursive(c, SourceFile, Depth+1)
 
+# Cursor kinds that can contain reflectable enums, and so need to be walked by fast parsing. Filled in on first use.
+DeclarationContextKinds = None
+
+def GetDeclarationContextKinds():
+	global DeclarationContextKinds
+	if DeclarationContextKinds is None:
+		import clang.cindex
+		DeclarationContextKinds = {
+			clang.cindex.CursorKind.NAMESPACE,
+			clang.cindex.CursorKind.CLASS_DECL,
+			clang.cindex.CursorKind.STRUCT_DECL,
+			clang.cindex.CursorKind.UNION_DECL,
+			clang.cindex.CursorKind.CLASS_TEMPLATE,
+			clang.cindex.CursorKind.LINKAGE_SPEC,
+			clang.cindex.CursorKind.UNEXPOSED_DECL,
+		}
+	return DeclarationContextKinds
+
 class CxxCompileEnvironment:
 	""" Compilation environment used to configure clang """
 	def __init__(self, InIncludePaths):
@@ -68,42 +99,162 @@ class CxxCompileEnvironment:
 		# We still need custom includes for things like the FOURCC macro, but standard includes are generally not needed.
 		self.CompilerArgs = ['-x', 'c++', '-std=c++17', '-nobuiltininc', '-nostdinc', '-nostdinc++', '-DIS_CODEGEN_SCRIPT=1']
 		self.IncludePaths = InIncludePaths
+		
+		# Further arguments of the project being analyzed, such as its defines and language standard
+		self.ExtraArgs = []
+		
+		# Fast parsing skips function bodies, and only walks the declaration contexts that enums can be reflected from
+		self.FastParse = False
+		
+		# Commonly included headers that are precompiled once, the PCH file built from them, and every file the PCH was
+		# built from. clang doesn't report files that come from the PCH as includes, but everything parsed with it
+		# depends on them.
+		self.PrecompiledHeaders = []
+		self.PrecompiledHeaderFile = None
+		self.PrecompiledHeaderIncludes = []
+		
+		# Largest number of headers analyzed together in a single translation unit; 0 or 1 analyzes each on its own
+		self.AggregateSize = 0
+	
+	def GetBaseClangArgs(self):
+		""" Returns the clang arguments, without the ones that pull in a precompiled header """
+		return self.CompilerArgs + self.ExtraArgs + ["-I" + Path for Path in self.IncludePaths]
 	
 	def GetClangArgs(self):
-		return self.CompilerArgs + ["-I" + Path for Path in self.IncludePaths]
+		Args = self.GetBaseClangArgs()
+		if self.PrecompiledHeaderFile:
+			Args += ["-include-pch", self.PrecompiledHeaderFile]
+		return Args
+	
+	def GetParseOptions(self):
+		import clang.cindex
+		if self.FastParse:
+			return clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES | clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+		return clang.cindex.TranslationUnit.PARSE_NONE
+	
+	def GetCacheKeyArgs(self):
+		""" Returns everything about this environment that affects analysis results """
+		Args = self.GetBaseClangArgs() + ["--pch-header=" + Header for Header in self.PrecompiledHeaders]
+		Args += ["--extractor=%s:%d" % (Extractor.Name, Extractor.Version) for Extractor in Extractors]
+		# Which headers are parsed together can make a difference, since they see the declarations of those before them
+		Args += ["--aggregate=%d" % self.AggregateSize] if self.AggregateSize > 1 else []
+		return Args + (["--fast-parse"] if self.FastParse else [])
 	
 class CxxEnumConstant:
 	""" A C++ enum constant """
-	def __init__(self, Cursor):
-		self.Cursor = Cursor
-		self.Name = Cursor.spelling
-		self.FullName = GetCursorFullyQualifiedName(Cursor)
-		self.Value = Cursor.enum_value
+	# The model holds plain data only. A cursor would keep its whole translation unit alive.
+	__slots__ = ("Name", "FullName", "Value")
+	
+	def __init__(self, Name, FullName, Value):
+		self.Name = Name
+		self.FullName = FullName
+		self.Value = Value
+	
+	@staticmethod
+	def FromCursor(Cursor):
+		Name = Cursor.spelling
 		
 		# Remove 'e' or 'k' prefix from the name
-		if len(self.Name) >= 2 and (self.Name[0] is 'e' or self.Name[0] is 'k') and not self.Name[1].islower():
-			self.Name = self.Name[1:]
+		if len(Name) >= 2 and (Name[0] is 'e' or Name[0] is 'k') and not Name[1].islower():
+			Name = Name[1:]
+		
+		return CxxEnumConstant(Name, GetCursorFullyQualifiedName(Cursor), Cursor.enum_value)
+	
+	@staticmethod
+	def FromData(Data):
+		return CxxEnumConstant(Data["Name"], Data["FullName"], Data["Value"])
+	
+	def ToData(self):
+		return {"Name": self.Name, "FullName": self.FullName, "Value": self.Value}
 
 class CxxEnum:
 	""" A C++ enum type """
-	def __init__(self, Cursor):
-		self.Cursor = Cursor
-		self.Name = Cursor.spelling
-		self.FullName = GetCursorFullyQualifiedName(Cursor)
+	__slots__ = ("Name", "FullName", "Constants", "ErrorValue", "SourcePath")
+	
+	def __init__(self, Name, FullName):
+		self.Name = Name
+		self.FullName = FullName
 		self.Constants = []
 		self.ErrorValue = -1
+		# File the enum is declared in; only known when the enum was analyzed rather than loaded from a cache
+		self.SourcePath = None
+	
+	def AddConstant(self, Constant):
+		self.Constants.append(Constant)
 		
+		LowercaseName = Constant.Name.lower()
+		if Constant.Value == -1 or "invalid" in LowercaseName or "unknown" in LowercaseName:
+			self.ErrorValue = Constant.Value
+	
+	def GetReflectedConstants(self):
+		""" Returns the constants that are reflected; when several constants share a value, the first one declared wins """
+		Constants = []
+		ValueSet = set()
+		
+		for Constant in self.Constants:
+			if Constant.Value not in ValueSet:
+				Constants.append(Constant)
+				ValueSet.add(Constant.Value)
+		
+		return Constants
+	
+	def GetValueIndex(self):
+		""" Returns the reflected constants sorted by their value as a C++ int, so the generated table can be binary searched by value """
+		return sorted(self.GetReflectedConstants(), key=lambda Constant: WrapToInt32(Constant.Value))
+	
+	def GetNameIndex(self):
+		""" Returns the reflected constants sorted in strcmp order, so the generated table can be binary searched by name """
+		return sorted(self.GetReflectedConstants(), key=lambda Constant: Constant.Name.encode("utf-8"))
+	
+	def GetDenseNames(self):
+		"""
+		Returns the first value and a list of names indexed by (value - first value) when the reflected values are
+		contiguous enough for a direct lookup table, with None in place of any holes. Returns None otherwise.
+		"""
+		Values = [Constant.Value for Constant in self.GetReflectedConstants()]
+		if not Values or min(Values) < -2**31 or max(Values) >= 2**31:
+			return None
+		
+		First = min(Values)
+		Size = max(Values) - First + 1
+		if Size > len(Values) * DenseTableMaxSizeRatio:
+			return None
+		
+		Names = [None] * Size
+		for Constant in self.GetReflectedConstants():
+			Names[Constant.Value - First] = Constant.Name
+		
+		return First, Names
+	
+	@staticmethod
+	def FromCursor(Cursor):
+		Enum = CxxEnum(Cursor.spelling, GetCursorFullyQualifiedName(Cursor))
+		Enum.SourcePath = Cursor.location.file.name if Cursor.location.file else None
+		
+		import clang.cindex
 		for Child in Cursor.get_children():
 			if Child.kind is clang.cindex.CursorKind.ENUM_CONSTANT_DECL:
-				Constant = CxxEnumConstant(Child)
-				self.Constants.append(Constant)
-				
-				LowercaseName = Constant.Name.lower()
-				if Constant.Value == -1 or "invalid" in LowercaseName or "unknown" in LowercaseName:
-					self.ErrorValue = Constant.Value
+				Enum.AddConstant(CxxEnumConstant.FromCursor(Child))
+		
+		return Enum
+	
+	@staticmethod
+	def FromData(Data):
+		Enum = CxxEnum(Data["Name"], Data["FullName"])
+		Enum.Constants = [CxxEnumConstant.FromData(ConstantData) for ConstantData in Data["Constants"]]
+		Enum.ErrorValue = Data["ErrorValue"]
+		return Enum
+	
+	def ToData(self):
+		return {
+			"Name": self.Name,
+			"FullName": self.FullName,
+			"Constants": [Constant.ToData() for Constant in self.Constants],
+			"ErrorValue": self.ErrorValue
+		}
 	
 	def DebugPrint(self):
-		print("Enum: %s (%s)" % (GetCursorFullyQualifiedName(self.Cursor), self.Cursor.location.file))
+		print("Enum: %s (%s)" % (self.FullName, self.SourcePath or ""))
 		
 		for Const in self.Constants:
 			print("- %s = %d" % (Const.Name, Const.Value))
@@ -112,6 +263,8 @@ class CxxEnum:
 
 class ScopedDeclare:
 	""" Recursive class that represents a scoped forward declare in the generated source code """
+	__slots__ = ("TypeName", "Name", "Children")
+	
 	def __init__(self, TypeName, Name):
 		self.TypeName = TypeName
 		self.Name = Name
@@ -149,17 +302,348 @@ class ScopedDeclare:
 		
 		return OutText
 		
+	@staticmethod
+	def FromData(Data):
+		Declare = ScopedDeclare(Data["TypeName"], Data["Name"])
+		Declare.Children = [ScopedDeclare.FromData(ChildData) for ChildData in Data["Children"]]
+		return Declare
+	
+	def ToData(self):
+		return {
+			"TypeName": self.TypeName,
+			"Name": self.Name,
+			"Children": [Child.ToData() for Child in self.Children]
+		}
+	
 	def DebugPrint(self):
 		print( self.GenerateText(0) )
 
+class NamePool:
+	""" The names of one generated file, deduplicated into a single character blob that name tables refer to by 32-bit
+	offset rather than by pointer. A name that ends another name shares its storage, so "Count" costs nothing next to
+	"MaxCount". """
+	# Offset that stands for no name, such as a hole in a dense name table
+	NoName = 0xFFFFFFFF
+	
+	def __init__(self, Names, Symbol):
+		# Name of the character array in the generated code
+		self.Symbol = Symbol
+		self.Names = []
+		self.Offsets = {}
+		self.Size = 0
+		
+		# Longer names are placed first, so that the names they end with can point into them
+		SuffixOffsets = {}
+		for Name in sorted(dict.fromkeys(Names), key=len, reverse=True):
+			if Name in SuffixOffsets:
+				self.Offsets[Name] = SuffixOffsets[Name]
+				continue
+			
+			self.Offsets[Name] = self.Size
+			self.Names.append(Name)
+			for i in range(1, len(Name)):
+				SuffixOffsets.setdefault(Name[i:], self.Size + len(Name[:i].encode("utf-8")))
+			self.Size += len(Name.encode("utf-8")) + 1
+	
+	@staticmethod
+	def GetSymbol(IncludeFile):
+		""" Returns a name for the pool of the code generated for IncludeFile, which differs between source files so
+		that their code can share a translation unit. """
+		return "skCodegenNamePool_" + hashlib.sha1(IncludeFile.encode("utf-8")).hexdigest()[:16]
+	
+	def GetOffset(self, Name):
+		return self.Offsets[Name] if Name is not None else NamePool.NoName
+	
+	def GenerateText(self):
+		""" Returns the definition of the pool. Every name gets a literal of its own, ending in an explicit null
+		character; adjacent literals are concatenated by the compiler. """
+		if not self.Names:
+			return "static const char %s[] = \"\";\n" % self.Symbol
+		Literals = ['\t"%s\\0"' % Name for Name in self.Names]
+		return "static const char %s[] =\n%s;\n" % (self.Symbol, "\n".join(Literals))
+
+class UnityNamePool:
+	""" Stands in for the name pool of a unity chunk fragment. The chunk that includes the fragment defines one pool
+	holding the names of all of its fragments, along with a constant for the offset of each name, which the
+	fragment's name tables refer to. That way names shared by several source files of a chunk are only stored once. """
+	Namespace = "CodegenUnityNames"
+	Symbol = Namespace + "::skNamePool"
+	
+	# Matches the references to names in the code generated for a fragment
+	ReferencePattern = re.compile(r"\b" + Namespace + r"::kName_(\w+)")
+	
+	@staticmethod
+	def GetConstant(Name):
+		return "kName_" + Name
+	
+	def GetOffset(self, Name):
+		if Name is None:
+			return NamePool.NoName
+		return "%s::%s" % (UnityNamePool.Namespace, UnityNamePool.GetConstant(Name))
+	
+	@staticmethod
+	def GenerateChunkText(Names):
+		""" Returns the definition of the pool of a unity chunk, and of the offset constants of its names """
+		if not Names:
+			return ""
+		Pool = NamePool(Names, "skNamePool")
+		Constants = ["\t%s = %d," % (UnityNamePool.GetConstant(Name), Pool.GetOffset(Name)) for Name in Pool.Offsets]
+		return "namespace %s\n{\nenum : uint32_t\n{\n%s\n};\n\n%s}\n" % (
+			UnityNamePool.Namespace, "\n".join(Constants), Pool.GenerateText())
+
+class Extractor:
+	""" Pulls one kind of reflection data out of source files. Every registered extractor sees the cursors of a source
+	file during a single shared traversal of a single parse, and builds a model of its own, which is cached along with
+	the source file and rendered by its own template section. """
+	# Name of the extractor; keys its model in SourceFile.Models, in serialized data and in the template
+	Name = ""
+	
+	# Bump whenever what the extractor puts in its models changes, so that cached models are analyzed again
+	Version = 1
+	
+	# Names of the cursor kinds handed to Visit, such as "ENUM_DECL"
+	CursorKinds = ()
+	
+	# Names of cursor kinds that fast parsing has to walk into on top of the declaration contexts, for extractors that
+	# look inside more than those
+	ContextKinds = ()
+	
+	# Tokens that a source file has to contain for the extractor to find anything in it, which the pre-filter looks for
+	PrefilterTokens = ()
+	
+	# Template section rendering the model, looked up next to the template and then among the built-in templates
+	TemplateSection = ""
+	
+	def CreateModel(self):
+		""" Returns an empty model for a source file """
+		raise NotImplementedError
+	
+	def Visit(self, Model, Cursor, Parent):
+		""" Called for every cursor of one of CursorKinds located in the source file, along with the cursor it's a child
+		of. Returns whether the traversal should skip the cursor's children. """
+		raise NotImplementedError
+	
+	def FinishModel(self, Model):
+		""" Called once the traversal is done, to drop anything that's only needed while analyzing """
+		pass
+	
+	def HasOutput(self, Model):
+		""" Returns whether the model needs any generated code """
+		raise NotImplementedError
+	
+	def GetHeaders(self, Model):
+		""" Returns the headers that the generated code for the model needs """
+		return []
+	
+	def ModelFromData(self, Data):
+		raise NotImplementedError
+	
+	def ModelToData(self, Model):
+		raise NotImplementedError
+
+class CxxEnumModel:
+	""" The enums of a source file, along with forward declares of the scopes they're declared in """
+	__slots__ = ("Enums", "RootDeclare", "UsedSymbols")
+	
+	def __init__(self):
+		self.Enums = []
+		self.RootDeclare = ScopedDeclare("", "")
+		# Qualified names of the enums found so far; only needed while analyzing
+		self.UsedSymbols = set()
+	
+	def GetNamePool(self, IncludeFile, UnityFragment=False):
+		""" Returns the pool holding the names of every enum of the source file, which their name tables refer to """
+		if UnityFragment:
+			return UnityNamePool()
+		Names = [Constant.Name for Enum in self.Enums for Constant in Enum.GetReflectedConstants()]
+		return NamePool(Names, NamePool.GetSymbol(IncludeFile))
+
+class EnumExtractor(Extractor):
+	""" Reflects named enums """
+	Name = "Enums"
+	CursorKinds = ("ENUM_DECL",)
+	PrefilterTokens = ("enum",)
+	TemplateSection = "enums.mako"
+	
+	def CreateModel(self):
+		return CxxEnumModel()
+	
+	def Visit(self, Model, Cursor, Parent):
+		# anonymous enums are not supported, so they're walked like any other cursor
+		if not Cursor.spelling:
+			return False
+		
+		# avoid the same enum being registered twice. This happens if you declare an enum and a variable of that enum simultaneously
+		QualifiedName = GetCursorFullyQualifiedName(Cursor)
+		
+		if QualifiedName in Model.UsedSymbols:
+			return True
+		else:
+			Model.UsedSymbols.add(QualifiedName)
+		
+		NewEnum = CxxEnum.FromCursor(Cursor)
+		Model.Enums.append(NewEnum)
+		
+		# Register any needed forward declares
+		import clang.cindex
+		DeclarationCursors = []
+		
+		while Parent is not None:
+			if Parent.kind is clang.cindex.CursorKind.CLASS_DECL or Parent.kind is clang.cindex.CursorKind.STRUCT_DECL:
+				DeclarationCursors.append(Parent)
+
+			elif Parent.kind is clang.cindex.CursorKind.NAMESPACE:
+				DeclarationCursors.append(Parent)
+
+			elif Parent.kind is clang.cindex.CursorKind.TRANSLATION_UNIT:
+				break
+			
+			Parent = Parent.semantic_parent
+		
+		if DeclarationCursors:
+			Declaration = Model.RootDeclare
+			
+			for i in range(len(DeclarationCursors)-1, -1, -1):
+				Decl = DeclarationCursors[i]
+				TypeName = "namespace" if Decl.kind is clang.cindex.CursorKind.NAMESPACE else "struct"
+				Declaration = Declaration.AddChild(TypeName, Decl.spelling)
+			
+			Declaration.AddChild("enum", NewEnum.Name)
+		
+		return True
+	
+	def FinishModel(self, Model):
+		Model.UsedSymbols = set()
+	
+	def HasOutput(self, Model):
+		return bool(Model.Enums)
+	
+	def GetHeaders(self, Model):
+		return ["codegen/EnumReflection.h"] if Model.Enums else []
+	
+	def ModelFromData(self, Data):
+		Model = CxxEnumModel()
+		Model.Enums = [CxxEnum.FromData(EnumData) for EnumData in Data["Enums"]]
+		Model.RootDeclare = ScopedDeclare.FromData(Data["ForwardDeclares"])
+		return Model
+	
+	def ModelToData(self, Model):
+		return {
+			"Enums": [Enum.ToData() for Enum in Model.Enums],
+			"ForwardDeclares": Model.RootDeclare.ToData()
+		}
+
+# Extractors that run on every analyzed source file, in order
+Extractors = [EnumExtractor()]
+
+def RegisterExtractor(NewExtractor):
+	""" Adds an extractor to run on every analyzed source file. Extractors have to be registered before anything is
+	analyzed, in every process that analyzes source files, since cached models only hold the extractors they were
+	made with. """
+	Extractors.append(NewExtractor)
+
+def CreateModels():
+	return {Extractor.Name: Extractor.CreateModel() for Extractor in Extractors}
+
+def GetExtractorsByKind():
+	""" Returns the extractors interested in each cursor kind """
+	import clang.cindex
+	ExtractorsByKind = {}
+	for Extractor in Extractors:
+		for KindName in Extractor.CursorKinds:
+			ExtractorsByKind.setdefault(getattr(clang.cindex.CursorKind, KindName), []).append(Extractor)
+	return ExtractorsByKind
+
+def GetTraversalContextKinds():
+	""" Returns the cursor kinds that fast parsing walks into """
+	import clang.cindex
+	ExtraKinds = {getattr(clang.cindex.CursorKind, KindName) for Extractor in Extractors for KindName in Extractor.ContextKinds}
+	return GetDeclarationContextKinds() | ExtraKinds if ExtraKinds else GetDeclarationContextKinds()
+
+def GetPrefilterTokens():
+	""" Returns the tokens that mark a source file as having something to extract, or None if an extractor can't tell
+	without parsing, and every source file has to be analyzed """
+	if not all(Extractor.PrefilterTokens for Extractor in Extractors):
+		return None
+	return list(dict.fromkeys(Token for Extractor in Extractors for Token in Extractor.PrefilterTokens))
+
+def GetTemplateSections():
+	return [Extractor.TemplateSection for Extractor in Extractors]
+
+class TranslationUnitCache:
+	""" Keeps translation units alive, so that parsing the same file again only needs a reparse """
+	def __init__(self):
+		self.TranslationUnits = {}
+	
+	def Parse(self, ClangIndex, FilePath, CompileEnvironment):
+		Args = CompileEnvironment.GetClangArgs()
+		Key = (FilePath, tuple(Args))
+		TranslationUnit = self.TranslationUnits.get(Key)
+		
+		if TranslationUnit is not None:
+			TranslationUnit.reparse()
+		else:
+			# The precompiled preamble makes reparses only pay for the part of the file after its includes
+			import clang.cindex
+			Options = CompileEnvironment.GetParseOptions() | clang.cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+			TranslationUnit = ClangIndex.parse(FilePath, Args, options=Options)
+			self.TranslationUnits[Key] = TranslationUnit
+		
+		return TranslationUnit
+	
+	def Release(self, FilePath):
+		for Key in [Key for Key in self.TranslationUnits if Key[0] == FilePath]:
+			del self.TranslationUnits[Key]
+
 class SourceFile:
 	""" A C++ source code file """
+	__slots__ = ("FilePath", "Models", "Includes")
+	
 	def __init__(self, FilePath):
 		self.FilePath = FilePath
-		self.Enums = []
-		self.RootDeclare = ScopedDeclare("", "")
+		# The model each extractor built, by extractor name
+		self.Models = CreateModels()
+		# Absolute paths of every file the source file includes, directly or indirectly
+		self.Includes = []
+	
+	@property
+	def Enums(self):
+		Model = self.Models.get(EnumExtractor.Name)
+		return Model.Enums if Model is not None else []
+	
+	@property
+	def RootDeclare(self):
+		Model = self.Models.get(EnumExtractor.Name)
+		return Model.RootDeclare if Model is not None else ScopedDeclare("", "")
+	
+	@staticmethod
+	def FromData(FilePath, Data):
+		""" Recreates an analyzed source file from the output of ToData(), without needing to parse it again """
+		File = SourceFile(FilePath)
+		File.Models = {Extractor.Name: Extractor.ModelFromData(Data["Models"][Extractor.Name]) for Extractor in Extractors}
+		File.Includes = Data["Includes"]
+		return File
+	
+	def ToData(self):
+		""" Returns the analysis results as plain data that can be serialized """
+		return {
+			"Models": {Extractor.Name: Extractor.ModelToData(self.Models[Extractor.Name]) for Extractor in Extractors},
+			"Includes": self.Includes
+		}
+	
+	def HasOutput(self):
+		""" Returns whether any extractor found something to generate code for """
+		return any(Extractor.HasOutput(self.Models[Extractor.Name]) for Extractor in Extractors)
+	
+	def FinishModels(self):
+		for Extractor in Extractors:
+			Extractor.FinishModel(self.Models[Extractor.Name])
+	
+	def GetHeaders(self):
+		""" Returns the headers the generated code needs, in the order the extractors ask for them """
+		return list(dict.fromkeys(Header for Extractor in Extractors for Header in Extractor.GetHeaders(self.Models[Extractor.Name])))
 		
-	def GetCodegenFile(self, SourceRoot: str, OutputRoot: str):
+	def GetCodegenFile(self, SourceRoot: str, OutputRoot: str, Extension: str = "cpp"):
 		""" Returns the path to store the auto-generated code for this source file """
 		abspath = os.path.abspath(self.FilePath)
 		relpath = os.path.relpath(abspath, SourceRoot)
@@ -167,105 +651,295 @@ class SourceFile:
 		filename_no_ext, ext = os.path.splitext(filename)
 		if len(ext):
 			ext = ext[1:]
-		return os.path.join(OutputRoot, reldir, filename_no_ext + '_' + ext + '_codegen.cpp')
+		return os.path.join(OutputRoot, reldir, filename_no_ext + '_' + ext + '_codegen.' + Extension)
 	
 	def LastModifiedTime(self):
 		""" Returns the last modified time for this source file """
 		return os.path.getmtime(self.FilePath)
 	
-	def Analyze(self, ClangIndex, CompileEnvironment):
+	def Analyze(self, ClangIndex, CompileEnvironment, TranslationUnits=None):
 		""" Analyzes the AST for any components that need generated code """
-		TranslationUnit = ClangIndex.parse(self.FilePath, CompileEnvironment.GetClangArgs())
-		self.UsedSymbols = set()
-		self.CursorRecurse(TranslationUnit.cursor, 0)
+		with timing.phase("parse", self.FilePath):
+			if TranslationUnits is not None:
+				TranslationUnit = TranslationUnits.Parse(ClangIndex, self.FilePath, CompileEnvironment)
+			else:
+				TranslationUnit = ClangIndex.parse(self.FilePath, CompileEnvironment.GetClangArgs(),
+												   options=CompileEnvironment.GetParseOptions())
+		
+		with timing.phase("traverse", self.FilePath):
+			self.Models = CreateModels()
+			self.CursorRecurse(TranslationUnit.cursor, CompileEnvironment.FastParse)
+			self.FinishModels()
+		
+		with timing.phase("includes", self.FilePath):
+			Includes = {os.path.abspath(Inclusion.include.name) for Inclusion in TranslationUnit.get_includes()}
+			self.Includes = sorted(Includes.union(CompileEnvironment.PrecompiledHeaderIncludes))
 		
 		if PrintAST:
 			DebugPrintCursorRecursive(TranslationUnit.cursor, self.FilePath)
 			print("")
-
-	def Generate(self, OutputPath: str):
-		if self.Enums:
-			with open("%s/template.mako" % TemplateDir, "r") as MakoTemplateFile:
-				MakoTemplateText = MakoTemplateFile.read()
-
-			MakoTemplate = mako.template.Template(MakoTemplateText)
-			GeneratedCode = MakoTemplate.render(Enums=self.Enums, IncludeFile=self.FilePath,
-												ForwardDeclares=self.RootDeclare.Children)
-
-			OutDir = os.path.dirname(OutputPath)
-			os.makedirs(OutDir, exist_ok=True)
-
-			with open(OutputPath, "w") as file:
-				file.write(GeneratedCode)
 		
-	def CursorRecurse(self, Cursor, Depth):
-		""" Recursive function that performs the actual analysis work of the AST """
-		for Child in Cursor.get_children():
+		# The extracted model holds no cursors, so this disposes of the translation unit right away, unless the
+		# translation unit cache is keeping it around to be reparsed
+		del TranslationUnit
+
+	def Render(self, MakoTemplate=None, UnityFragment=False) -> str:
+		""" Returns the generated code for this source file; as a fragment included by a unity chunk if UnityFragment
+		is set """
+		if MakoTemplate is None:
+			MakoTemplate = templates.get_template()
+
+		with timing.phase("render", self.FilePath):
+			return MakoTemplate.render(Enums=self.Enums, IncludeFile=self.FilePath,
+									   ForwardDeclares=self.RootDeclare.Children, Models=self.Models,
+									   Extractors=Extractors, Headers=self.GetHeaders(), UnityFragment=UnityFragment)
+
+	def Generate(self, OutputPath: str, MakoTemplate=None) -> bool:
+		""" Writes the generated code to OutputPath. Returns whether the file changed; identical output isn't rewritten. """
+		if not self.HasOutput():
+			return False
+		
+		GeneratedCode = self.Render(MakoTemplate)
+		
+		with timing.phase("write", self.FilePath):
+			return write_file_if_changed(OutputPath, GeneratedCode)
+		
+	def CursorRecurse(self, Cursor, DeclarationContextsOnly=False, Owners=None):
+		""" Performs the actual analysis work of the AST, handing each cursor to the extractors interested in its kind. The tree is walked iteratively, so deeply nested code can't hit the recursion limit. """
+		ContextKinds = GetTraversalContextKinds()
+		ExtractorsByKind = GetExtractorsByKind()
+		
+		# Translation units covering several source files pass the source files by normalized path, and each cursor is
+		# assigned to the one it's located in. Lookups are memoized by the file name clang reports.
+		OwnersByName = {}
+		
+		# Stack of cursors being visited, along with an iterator over their remaining children
+		Stack = [(Cursor, Cursor.get_children())]
+		
+		while Stack:
+			Cursor, Children = Stack[-1]
+			Child = next(Children, None)
+			
+			if Child is None:
+				Stack.pop()
+				continue
+			
 			# skip if this cursor isn't from the real source file
 			# if this check passes it means the cursor is from an include file, we don't care about that
-			if not Child.location.file or not Child.location.file.name.endswith(self.FilePath):
+			if not Child.location.file:
 				continue
-				
-			# check for enum; anonymous enums are not supported
-			if Child.kind is clang.cindex.CursorKind.ENUM_DECL and Child.spelling:
-				# avoid the same enum being registered twice. This happens if you declare an enum and a variable of that enum simultaneously
-				QualifiedName = GetCursorFullyQualifiedName(Child)
-				
-				if QualifiedName in self.UsedSymbols:
+			
+			FileName = Child.location.file.name
+			if Owners is None:
+				if not FileName.endswith(self.FilePath):
 					continue
-				else:
-					self.UsedSymbols.add(QualifiedName)
-					
-				NewEnum = CxxEnum(Child)
-				self.Enums.append(NewEnum)
-				
-				# Register any needed forward declares
-				Parent = Cursor
-				DeclarationCursors = []
-				
-				while Parent is not None:
-					if Parent.kind is clang.cindex.CursorKind.CLASS_DECL or Parent.kind is clang.cindex.CursorKind.STRUCT_DECL:
-						DeclarationCursors.append(Parent)
-
-					elif Parent.kind is clang.cindex.CursorKind.NAMESPACE:
-						DeclarationCursors.append(Parent)
-
-					elif Parent.kind is clang.cindex.CursorKind.TRANSLATION_UNIT:
-						break
-					
-					Parent = Parent.semantic_parent
-					
-				if DeclarationCursors:
-					Declaration = self.RootDeclare
-					
-					for i in range(len(DeclarationCursors)-1, -1, -1):
-						Decl = DeclarationCursors[i]
-						TypeName = "namespace" if Decl.kind is clang.cindex.CursorKind.NAMESPACE else "struct"
-						Declaration = Declaration.AddChild(TypeName, Decl.spelling)
-					
-					Declaration.AddChild("enum", NewEnum.Name)
-					
-			# currently we're only testing enums - recurse for non-enum types to look for more enums
+				Owner = self
 			else:
-				self.CursorRecurse(Child, Depth + 1)
+				Owner = OwnersByName.get(FileName, False)
+				if Owner is False:
+					Owner = OwnersByName[FileName] = Owners.get(NormalizePath(FileName))
+				if Owner is None:
+					continue
+			
+			# Every extractor interested in the cursor sees it, and any of them can claim its children
+			Kind = Child.kind
+			SkipChildren = False
+			for Extractor in ExtractorsByKind.get(Kind, ()):
+				if Extractor.Visit(Owner.Models[Extractor.Name], Child, Cursor):
+					SkipChildren = True
+			
+			# recurse to look for more cursors the extractors are interested in
+			if not SkipChildren and (not DeclarationContextsOnly or Kind in ContextKinds):
+				Stack.append((Child, Child.get_children()))
+
+
+def VisitDescendants(Cursor, Visit):
+	""" Calls Visit with every cursor under Cursor, in preorder. The whole walk is a single libclang call, which is
+	several times quicker than walk_preorder() on large trees. """
+	import clang.cindex
+	TranslationUnit = Cursor._tu
+	
+	def Visitor(Child, Parent, Data):
+		# Like get_children(), keep the translation unit alive for as long as the cursor is
+		Child._tu = TranslationUnit
+		Visit(Child)
+		return 2  # CXChildVisit_Recurse
+	
+	clang.cindex.conf.lib.clang_visitChildren(Cursor, clang.cindex.callbacks['cursor_visit'](Visitor), None)
+
+
+def NormalizePath(FilePath):
+	return os.path.normpath(os.path.abspath(FilePath))
+
+
+def GetIncludeClosure(FilePath, IncludedFiles):
+	""" Returns every file that FilePath includes, directly or indirectly, given the files each file includes directly """
+	Closure = set()
+	Stack = [FilePath]
+	while Stack:
+		for Included in IncludedFiles.get(Stack.pop(), ()):
+			if Included not in Closure:
+				Closure.add(Included)
+				Stack.append(Included)
+	Closure.discard(FilePath)
+	return Closure
+
+
+# Cursor kinds that name a declaration, which an aggregate parse checks each header can see on its own. Filled in on
+# first use.
+ReferenceKinds = None
+
+
+def GetReferenceKinds():
+	global ReferenceKinds
+	if ReferenceKinds is None:
+		import clang.cindex
+		ReferenceKinds = {
+			clang.cindex.CursorKind.TYPE_REF,
+			clang.cindex.CursorKind.TEMPLATE_REF,
+			clang.cindex.CursorKind.MEMBER_REF,
+			clang.cindex.CursorKind.OVERLOADED_DECL_REF,
+			clang.cindex.CursorKind.DECL_REF_EXPR,
+			clang.cindex.CursorKind.MEMBER_REF_EXPR,
+		}
+	return ReferenceKinds
+
+
+def AnalyzeAggregate(ClangIndex, FilePaths, CompileEnvironment):
+	""" Analyzes several headers at once, by parsing a single in-memory translation unit that includes all of them, so
+	that the includes they share are only parsed once. Returns the analyzed source files by path. Headers that an error
+	may have affected, or that rely on what an earlier header declares, are left out, for the caller to analyze on
+	their own. """
+	import clang.cindex
+	
+	Files = [SourceFile(FilePath) for FilePath in FilePaths]
+	Paths = [NormalizePath(FilePath) for FilePath in FilePaths]
+	
+	# The umbrella file only exists in memory. It's placed next to the first header, as if it were a source file of the
+	# same directory; the headers themselves are included by absolute path.
+	UmbrellaPath = os.path.join(os.path.dirname(Paths[0]), "__codegen_aggregate__.cpp")
+	UmbrellaText = "".join('#include "%s"\n' % Path for Path in Paths)
+	
+	with timing.phase("aggregate_parse", FilePaths[0]):
+		# The detailed processing record provides the inclusion directives, which the dependencies are worked out from
+		Options = CompileEnvironment.GetParseOptions() | clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+		TranslationUnit = ClangIndex.parse(UmbrellaPath, CompileEnvironment.GetClangArgs(),
+										   unsaved_files=[(UmbrellaPath, UmbrellaText)], options=Options)
+	
+	with timing.phase("includes", FilePaths[0]):
+		# Unlike get_includes(), inclusion directives also cover files that an include guard skipped, because an earlier
+		# header already included them; each header still depends on those.
+		IncludedFiles = {}
+		# Files declaring or defining what each header refers to: the macros it expands, and the types, templates
+		# and values it names
+		ReferencedFiles = {}
+		NormalizedPaths = {}
+		PathSet = set(Paths)
+		ReferenceCursorKinds = GetReferenceKinds()
+		HeaderPath = None
+		
+		def AddReferencedFile(Referenced):
+			if Referenced is not None and Referenced.location.file:
+				FileName = Referenced.location.file.name
+				ReferencedPath = NormalizedPaths.get(FileName)
+				if ReferencedPath is None:
+					ReferencedPath = NormalizedPaths[FileName] = NormalizePath(FileName)
+				ReferencedFiles.setdefault(HeaderPath, set()).add(ReferencedPath)
+		
+		def VisitReference(Node):
+			Kind = Node.kind
+			if Kind in ReferenceCursorKinds:
+				Referenced = Node.referenced
+				# A type is resolved to its definition, which a header that only needs it to be declared, such as for a
+				# pointer, needn't see
+				if Referenced is not None and Kind is clang.cindex.CursorKind.TYPE_REF:
+					Referenced = Referenced.canonical
+				AddReferencedFile(Referenced)
+		
+		for Cursor in TranslationUnit.cursor.get_children():
+			if not Cursor.location.file:
+				continue
+			Kind = Cursor.kind
+			if Kind is clang.cindex.CursorKind.INCLUSION_DIRECTIVE:
+				try:
+					Included = Cursor.get_included_file()
+				except AssertionError:
+					# The bindings assert on includes that weren't found, which an error diagnostic reports anyway
+					continue
+				IncludedFiles.setdefault(NormalizePath(Cursor.location.file.name), set()).add(NormalizePath(Included.name))
+				continue
+			
+			HeaderPath = NormalizePath(Cursor.location.file.name)
+			if HeaderPath not in PathSet:
+				continue
+			if Kind is clang.cindex.CursorKind.MACRO_INSTANTIATION:
+				AddReferencedFile(Cursor.referenced)
+			elif Kind.is_declaration():
+				VisitDescendants(Cursor, VisitReference)
+		
+		for File, Path in zip(Files, Paths):
+			File.Includes = sorted(GetIncludeClosure(Path, IncludedFiles).union(CompileEnvironment.PrecompiledHeaderIncludes))
+	
+	# Macros and declarations of a header are still visible in the headers after it, which their own parse wouldn't
+	# see. Leave out every header that refers to anything that neither it nor anything it includes declares.
+	Excluded = set()
+	for Index, (File, Path) in enumerate(zip(Files, Paths)):
+		Visible = set(File.Includes)
+		Visible.add(Path)
+		if not ReferencedFiles.get(Path, set()) <= Visible:
+			Excluded.add(Index)
+	
+	# Leave out every header that an error lies in or under. clang reports nothing after a fatal error, so every header
+	# from the one that hit it onwards is left out as well.
+	for Diagnostic in TranslationUnit.diagnostics:
+		if Diagnostic.severity < clang.cindex.Diagnostic.Error:
+			continue
+		
+		ErrorPath = NormalizePath(Diagnostic.location.file.name) if Diagnostic.location.file else None
+		Affected = [Index for Index, File in enumerate(Files)
+					if ErrorPath == Paths[Index] or ErrorPath in File.Includes]
+		if not Affected:
+			# The error can't be pinned on any header, such as one in the arguments
+			return {}
+		
+		Excluded.update(Affected)
+		if Diagnostic.severity >= clang.cindex.Diagnostic.Fatal:
+			Excluded.update(range(min(Affected), len(Files)))
+	
+	Owners = {Path: File for Index, (File, Path) in enumerate(zip(Files, Paths)) if Index not in Excluded}
+	with timing.phase("traverse", FilePaths[0]):
+		if Owners:
+			Files[0].CursorRecurse(TranslationUnit.cursor, CompileEnvironment.FastParse, Owners)
+	
+	del TranslationUnit
+	for File in Owners.values():
+		File.FinishModels()
+	return {File.FilePath: File for File in Owners.values()}
 
 
-def RunCodegen(file_path: str, include_paths: Iterable[str], lib_clang_path: str, source_root: str, output_root: str):
-	file = GetAnalyzedSourceFile(file_path, include_paths, lib_clang_path)
+def RunCodegen(file_path: str, include_paths: Iterable[str], lib_clang_path: str, source_root: str, output_root: str,
+			   clang_index=None):
+	file = GetAnalyzedSourceFile(file_path, include_paths, lib_clang_path, clang_index)
 	output_path = file.GetCodegenFile(source_root, output_root)
 	file.Generate(output_path)
 
 
-# if EnableProfiling:
-# 	cProfile.run('RunCodegen()')
-# else:
-# 	RunCodegen()
+def CreateClangIndex(LibClangPath: str):
+	""" Loads libclang (once per process) and creates a new clang index """
+	import clang.cindex
+	if clang.cindex.Config.loaded:
+		return clang.cindex.Index.create()
+	
+	clang.cindex.Config.set_library_file(LibClangPath)
+	# libclang itself is loaded when the first index is created
+	with timing.phase("load_libclang"):
+		return clang.cindex.Index.create()
 
 
-def GetAnalyzedSourceFile(FilePath: str, IncludePaths: Iterable[str], LibClangPath: str) -> SourceFile:
-	# Clang index
-	clang.cindex.Config.set_library_file(LibClangPath)
-	ClangIndex = clang.cindex.Index.create()
+def GetAnalyzedSourceFile(FilePath: str, IncludePaths: Iterable[str], LibClangPath: str, ClangIndex=None) -> SourceFile:
+	# Clang index; reuse the caller's index if there is one so batches only pay for it once
+	if ClangIndex is None:
+		ClangIndex = CreateClangIndex(LibClangPath)
 
 	# C++ environment
 	CompileEnvironment = CxxCompileEnvironment(IncludePaths)
@@ -281,15 +955,12 @@ def get_output_files(
 		lib_clang_path: str,
 		source_root: str,
 		output_root: str,
-		cache_path: Optional[str]
+		cache_path: Optional[str],
+		clang_index=None
 ) -> List[str]:
 
-	file = GetAnalyzedSourceFile(source_file, include_paths, lib_clang_path)
-
-	if not file.Enums:
-		output_files = []
-	else:
-		output_files = [file.GetCodegenFile(source_root, output_root)]
+	file = GetAnalyzedSourceFile(source_file, include_paths, lib_clang_path, clang_index)
+	output_files = get_source_file_outputs(file, source_root, output_root)
 
 	if cache_path:
 		cache_output_files(cache_path, source_root, source_file, output_files)
@@ -297,6 +968,12 @@ def get_output_files(
 	return output_files
 
 
+def get_source_file_outputs(file: SourceFile, source_root: str, output_root: str, extension: str = 'cpp') -> List[str]:
+	if not file.HasOutput():
+		return []
+	return [file.GetCodegenFile(source_root, output_root, extension)]
+
+
 def cache_output_files(cache_path: str, source_root: str, file_path: str, output_files: List[str]) -> None:
 	cache_file_path = get_output_files_cache_filename(cache_path, source_root, file_path)
 	cache_file_dir = os.path.dirname(cache_file_path)
@@ -305,6 +982,13 @@ def cache_output_files(cache_path: str, source_root: str, file_path: str, output
 		f.write(';'.join(output_files))
 
 
+def cache_output_dependencies(cache_path: str, source_root: str, file_path: str, dependencies: List[str]) -> None:
+	""" Caches the files that the outputs of a source file depend on besides the source file itself """
+	cache_file_path = get_output_files_cache_filename(cache_path, source_root, file_path)[:-len('.outputs')] + '.deps'
+	with open(cache_file_path, 'w') as f:
+		f.write(';'.join(dependencies))
+
+
 def get_output_files_cache_filename(cache_path: str, source_root: str, file_path: str) -> str:
 	abspath = os.path.abspath(file_path)
 	relpath = os.path.relpath(abspath, source_root)
@@ -0,0 +1,64 @@
+<%page args="Model"/>\
+% if Model.Enums:
+<% Pool = Model.GetNamePool(IncludeFile, UnityFragment) %>\
+% if UnityFragment:
+// The tables below refer to the names in the pool of the unity chunk that includes this file
+
+% else:
+// Names of every enum constant below; the tables hold offsets into it
+${Pool.GenerateText()}
+% endif
+% endif
+% for Enum in Model.Enums:
+<% ValueIndex = Enum.GetValueIndex() %>\
+template <>
+const CEnumNameMapEntry TEnumReflection<${Enum.FullName}>::skNameMapEntries[] = {
+	% for Constant in ValueIndex:
+	{ (int) ${Constant.Value}, ${Pool.GetOffset(Constant.Name)} }, // ${Constant.Name}
+	% endfor
+	% if not ValueIndex:
+	{ 0, kNoEnumName },
+	% endif
+};
+
+template <>
+const CEnumNameMap TEnumReflection<${Enum.FullName}>::skNameMap = {
+	TEnumReflection<${Enum.FullName}>::skNameMapEntries, ${len(ValueIndex)}, ${Pool.Symbol}
+};
+
+<% NameIndex = Enum.GetNameIndex() %>\
+template <>
+const CEnumNameIndexEntry TEnumReflection<${Enum.FullName}>::skNameIndex[] = {
+	% for Constant in NameIndex:
+	{ ${Pool.GetOffset(Constant.Name)}, (int) ${Constant.Value} }, // ${Constant.Name}
+	% endfor
+	% if not NameIndex:
+	{ kNoEnumName, 0 },
+	% endif
+};
+
+template <>
+const unsigned TEnumReflection<${Enum.FullName}>::skNameIndexSize = ${len(NameIndex)};
+
+<% DenseNames = Enum.GetDenseNames() %>\
+template <>
+const uint32_t TEnumReflection<${Enum.FullName}>::skDenseNameOffsets[] = {
+	% if DenseNames:
+	% for Name in DenseNames[1]:
+	${Pool.GetOffset(Name) if Name is not None else "kNoEnumName"},
+	% endfor
+	% else:
+	kNoEnumName,
+	% endif
+};
+
+template <>
+const int TEnumReflection<${Enum.FullName}>::skDenseFirst = ${DenseNames[0] if DenseNames else 0};
+
+template <>
+const unsigned TEnumReflection<${Enum.FullName}>::skDenseSize = ${len(DenseNames[1]) if DenseNames else 0};
+
+template <>
+const int TEnumReflection<${Enum.FullName}>::skErrorValue = ${Enum.ErrorValue};
+
+% endfor
@@ -1,6 +1,6 @@
-% if Enums:
-#include <codegen/EnumReflection.h>
-% endif
+% for Header in Headers:
+#include <${Header}>
+% endfor
 #include "${IncludeFile}"
 
 #pragma warning( push )
@@ -11,21 +11,7 @@
 ## ${Decl.GenerateText(0)}
 ## % endfor
 
-% for Enum in Enums:
-template <>
-const CEnumNameMap TEnumReflection<${Enum.FullName}>::skNameMap = {
-<% ValueSet = set() %> \
-	% for Constant in Enum.Constants:
-	% if Constant.Value not in ValueSet:
-	{ ${Constant.Value}, "${Constant.Name}" },
-<% ValueSet.add(Constant.Value) %> \
-	% endif
-	% endfor
-};
-
-template <>
-const int TEnumReflection<${Enum.FullName}>::skErrorValue = ${Enum.ErrorValue};
-
+% for Extractor in Extractors:
+<%include file="${Extractor.TemplateSection}" args="Model=Models[Extractor.Name]"/>\
 % endfor
-
 #pragma warning( pop )
@@ -0,0 +1,44 @@
+import os
+from typing import List
+
+
+def write_file_atomic(file_path: str, text: str) -> None:
+    """
+    Writes a text file by writing a temporary file next to it and renaming it into place, so that other processes only
+    ever see the old contents or the complete new contents.
+    """
+    temp_file_path = '%s.%d.tmp' % (file_path, os.getpid())
+    try:
+        with open(temp_file_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+
+def write_file_if_changed(file_path: str, text: str) -> bool:
+    """
+    Atomically writes a text file unless it already has exactly these contents, in which case it is left untouched so
+    that its mtime doesn't trigger rebuilds. Returns whether the file was written.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    write_file_atomic(file_path, text)
+    return True
+
+
+def write_depfile(depfile_path: str, target: str, dependencies: List[str]) -> None:
+    """Writes a Makefile style depfile, as understood by Make and Ninja"""
+    def escape(path: str) -> str:
+        return path.replace('\\', '/').replace(' ', '\\ ').replace('#', '\\#').replace('$', '$$')
+
+    lines = [escape(target) + ':'] + [' ' + escape(dependency) for dependency in dependencies]
+    write_file_if_changed(depfile_path, ' \\\n'.join(lines) + '\n')
@@ -0,0 +1,137 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import codegen
+from codegen.fileutil import write_file_atomic
+
+# Precompiled headers built or validated by this process and the stamps of the files they were built from, keyed by their
+# cache key. The stamps are still checked on every use, since the headers may change while the process runs.
+_known_precompiled_headers: Dict[str, Tuple[str, Dict[str, List[int]]]] = {}
+
+# Files that precompiled headers were built from, keyed by PCH path, along with the mtime of the stamps they were read from
+_included_files: Dict[str, Tuple[int, List[str]]] = {}
+
+# Directory for precompiled headers when no cache path is given; removed when the process exits
+_temp_directory: Optional[str] = None
+
+
+def _get_temp_directory() -> str:
+    global _temp_directory
+    if _temp_directory is None:
+        _temp_directory = tempfile.mkdtemp(prefix='codegen-pch-')
+        atexit.register(shutil.rmtree, _temp_directory, True)
+    return _temp_directory
+
+
+def compute_precompiled_header_key(headers: List[str], clang_args: List[str], lib_clang_path: str) -> str:
+    """
+    Returns the key of a precompiled header. A PCH can only be used with the exact arguments and libclang build it was
+    made with, so those are part of the key along with the headers it contains.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(codegen.__version__.encode('utf-8'))
+    lib_clang_stat = os.stat(lib_clang_path)
+    hasher.update(('\n%s;%d;%d\n' % (os.path.abspath(lib_clang_path), lib_clang_stat.st_size,
+                                     lib_clang_stat.st_mtime_ns)).encode('utf-8'))
+    hasher.update('\0'.join(clang_args).encode('utf-8'))
+    for header in headers:
+        hasher.update(('\n' + os.path.abspath(header)).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _get_file_stamps(file_paths: List[str]) -> Dict[str, List[int]]:
+    stamps = {}
+    for file_path in file_paths:
+        file_stat = os.stat(file_path)
+        stamps[file_path] = [file_stat.st_mtime_ns, file_stat.st_size]
+    return stamps
+
+
+def _stamps_match(stamps: Dict[str, List[int]]) -> bool:
+    try:
+        return _get_file_stamps(list(stamps.keys())) == stamps
+    except OSError:
+        return False
+
+
+def _load_up_to_date_stamps(pch_path: str, stamps_path: str) -> Optional[Dict[str, List[int]]]:
+    """Returns the stamps of a precompiled header if it exists and none of the files it was built from changed"""
+    try:
+        with open(stamps_path, 'r') as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return stamps if os.path.exists(pch_path) and _stamps_match(stamps) else None
+
+
+def get_precompiled_header(
+        clang_index,
+        headers: List[str],
+        clang_args: List[str],
+        parse_options: int,
+        lib_clang_path: str,
+        cache_path: Optional[str]
+) -> str:
+    """
+    Returns the path to a precompiled header containing the given headers, building it if there is no up to date one.
+    The files it was built from are recorded next to it, so it gets rebuilt if any of them change.
+    """
+    key = compute_precompiled_header_key(headers, clang_args, lib_clang_path)
+    known = _known_precompiled_headers.get(key)
+    if known is not None and _stamps_match(known[1]) and os.path.exists(known[0]):
+        return known[0]
+
+    directory = os.path.join(cache_path, 'pch') if cache_path else _get_temp_directory()
+    pch_path = os.path.join(directory, key + '.pch')
+    stamps_path = pch_path + '.stamps'
+
+    stamps = _load_up_to_date_stamps(pch_path, stamps_path)
+    if stamps is None:
+        import clang.cindex
+        os.makedirs(directory, exist_ok=True)
+
+        # Parse an umbrella header that includes everything, as a header, and save the result as the PCH
+        umbrella_path = os.path.join(directory, key + '.h')
+        umbrella_text = ''.join('#include "%s"\n' % os.path.abspath(header) for header in headers)
+        header_args = ['c++-header' if arg == 'c++' else arg for arg in clang_args]
+        translation_unit = clang_index.parse(
+            umbrella_path,
+            header_args,
+            unsaved_files=[(umbrella_path, umbrella_text)],
+            options=parse_options | clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+        )
+
+        errors = [str(diagnostic) for diagnostic in translation_unit.diagnostics
+                  if diagnostic.severity >= clang.cindex.Diagnostic.Error]
+        if errors:
+            raise RuntimeError('Failed to build precompiled header:\n' + '\n'.join(errors))
+
+        temp_pch_path = '%s.%d.tmp' % (pch_path, os.getpid())
+        translation_unit.save(temp_pch_path)
+        os.replace(temp_pch_path, pch_path)
+
+        included_files = [os.path.abspath(inclusion.include.name) for inclusion in translation_unit.get_includes()]
+        stamps = _get_file_stamps(sorted(set(included_files)))
+        write_file_atomic(stamps_path, json.dumps(stamps))
+
+    _known_precompiled_headers[key] = (pch_path, stamps)
+    return pch_path
+
+
+def get_included_files(pch_path: str) -> List[str]:
+    """
+    Returns every file a precompiled header was built from. Files parsed with the PCH depend on all of them, even though
+    clang doesn't report them as includes of those files.
+    """
+    stamps_path = pch_path + '.stamps'
+    mtime = os.stat(stamps_path).st_mtime_ns
+    known = _included_files.get(pch_path)
+    if known is None or known[0] != mtime:
+        with open(stamps_path, 'r') as f:
+            known = _included_files[pch_path] = (mtime, sorted(os.path.abspath(path) for path in json.load(f)))
+    return known[1]
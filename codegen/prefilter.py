@@ -0,0 +1,55 @@
+import functools
+import mmap
+import re
+from typing import Iterable, Tuple
+
+# Comments, string and character literals, and numbers. Numbers are matched so that digit separators (1'000) aren't
+# mistaken for the start of a character literal. Anything that fails to match, like an unterminated comment, is left
+# in place and scanned as code, which can only cause false positives.
+_comment_or_literal = re.compile(
+    rb'''
+    //(?:\\\r?\n|[^\n])*                            # line comment, including line continuations
+    | /\*.*?\*/                                     # block comment
+    | (?:\b(?:u8|u|U|L))?R"([^()\\\s]{0,16})\(.*?\)\1"  # raw string literal
+    | "(?:\\.|[^"\\\n])*"                           # string literal
+    | '(?:\\.|[^'\\\n])*'                           # character literal
+    | (?<![\w.])\.?\d(?:[eEpP][+-]|[\w.'])*         # number
+    ''',
+    re.S | re.X
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_token_pattern(tokens: Tuple[bytes, ...]):
+    return re.compile(rb'\b(?:' + b'|'.join(re.escape(token) for token in tokens) + rb')\b')
+
+
+def may_contain_tokens(file_path: str, tokens: Iterable[str]) -> bool:
+    """
+    Returns whether any of the tokens appears in a source file outside of comments and literals, without parsing it.
+    This is conservative: macros can hide tokens, so the names of macros that expand to them have to be passed as well.
+    """
+    tokens = tuple(dict.fromkeys(token.encode('utf-8') for token in tokens))
+    pattern = _compile_token_pattern(tokens)
+
+    with open(file_path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return False
+
+        with data:
+            # Most files never mention any of the tokens at all, which is a cheap check
+            if not any(data.find(token) != -1 for token in tokens):
+                return False
+            return pattern.search(_comment_or_literal.sub(b' ', data)) is not None
+
+
+def may_contain_enum(file_path: str, extra_tokens: Iterable[str] = ()) -> bool:
+    """
+    Returns whether a source file might declare an enum, without parsing it. This is conservative: it returns False only
+    if the 'enum' keyword appears nowhere outside of comments and literals. Macros that expand to enum declarations
+    can't be seen this way, so their names must be passed in extra_tokens.
+    """
+    return may_contain_tokens(file_path, ['enum'] + list(extra_tokens))
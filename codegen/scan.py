@@ -0,0 +1,151 @@
+"""
+Project scans driven by a compilation database (compile_commands.json), as written by CMake with
+CMAKE_EXPORT_COMPILE_COMMANDS or by tools such as Bear.
+
+Every header takes the include paths, defines and language standard of the compile command closest to it. Headers that
+end up with identical arguments are processed as one batch, so they share their precompiled header and cache keys, and
+all batches run on one shared set of worker processes.
+"""
+import collections
+import copy
+import json
+import os
+import shlex
+from typing import Dict, List, Optional, Tuple
+
+from codegen import batch
+
+# Flags that take a path, either attached or as the next argument. Paths are resolved against the command's directory.
+path_flags = ('-isystem', '-iquote', '-idirafter', '-include', '-I')
+
+# Flags that take a value, either attached or as the next argument
+value_flags = ('-D', '-U')
+
+# Analysis arguments of a compile command: its include paths, and every other argument that affects analysis
+Environment = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+class CompileCommand(object):
+    """The parts of a compilation database entry that affect analysis"""
+    def __init__(self, file: str, include_paths: List[str], clang_args: List[str]) -> None:
+        self.file = file
+        self.include_paths = include_paths
+        self.clang_args = clang_args
+
+    @property
+    def environment(self) -> Environment:
+        return tuple(self.include_paths), tuple(self.clang_args)
+
+
+def find_compilation_database(path: str) -> str:
+    """Accepts either a compile_commands.json file or the build directory containing it"""
+    if os.path.isdir(path):
+        return os.path.join(path, 'compile_commands.json')
+    return path
+
+
+def _split_flag(arguments: List[str], index: int, flags: Tuple[str, ...]) -> Tuple[Optional[str], Optional[str], int]:
+    """Returns the flag at index, its value, and the index after them. The flag is None if it isn't one of flags."""
+    arg = arguments[index]
+    for flag in flags:
+        if arg == flag:
+            if index + 1 < len(arguments):
+                return flag, arguments[index + 1], index + 2
+            return None, None, index + 1
+        if arg.startswith(flag):
+            return flag, arg[len(flag):], index + 1
+    return None, None, index + 1
+
+
+def parse_arguments(arguments: List[str], directory: str) -> Tuple[List[str], List[str]]:
+    """
+    Picks the include paths, and the defines, forced includes and language standard out of a compiler command line.
+    Everything else, such as warnings, optimization and output flags, doesn't affect analysis and is dropped.
+    """
+    include_paths = []
+    clang_args = []
+    # The first argument is the compiler itself
+    index = 1
+    while index < len(arguments):
+        arg = arguments[index]
+        flag, value, next_index = _split_flag(arguments, index, path_flags)
+        if flag is not None:
+            path = os.path.normpath(os.path.join(directory, value))
+            if flag == '-I':
+                include_paths.append(path)
+            else:
+                clang_args += [flag, path]
+            index = next_index
+            continue
+
+        flag, value, next_index = _split_flag(arguments, index, value_flags)
+        if flag is not None:
+            clang_args.append(flag + value)
+        elif arg.startswith('-std=') and '++' in arg:
+            # Headers are always analyzed as C++, so the standard of C sources doesn't apply
+            clang_args.append(arg)
+        index = next_index
+    return include_paths, clang_args
+
+
+def load_compile_commands(path: str) -> List[CompileCommand]:
+    with open(find_compilation_database(path), 'r') as f:
+        entries = json.load(f)
+
+    commands = []
+    for entry in entries:
+        directory = entry['directory']
+        arguments = entry['arguments'] if 'arguments' in entry else shlex.split(entry['command'])
+        include_paths, clang_args = parse_arguments(arguments, directory)
+        file = os.path.normpath(os.path.join(directory, entry['file']))
+        commands.append(CompileCommand(file, include_paths, clang_args))
+    return commands
+
+
+def assign_environments(source_files: List[str], commands: List[CompileCommand]) -> Dict[Environment, List[str]]:
+    """
+    Groups source files by the analysis arguments they get. A source file gets those of its own compile command if it
+    has one, otherwise those of the first compile command in its directory or the closest directory above it. Source
+    files with no compile command anywhere above them get the arguments most of the project is compiled with.
+    """
+    by_file = {command.file: command for command in commands}
+    by_directory: Dict[str, CompileCommand] = {}
+    for command in sorted(commands, key=lambda command: command.file):
+        by_directory.setdefault(os.path.dirname(command.file), command)
+    counts = collections.Counter(command.environment for command in commands)
+    fallback = counts.most_common(1)[0][0] if counts else ((), ())
+
+    groups: Dict[Environment, List[str]] = {}
+    for source_file in source_files:
+        path = os.path.normpath(os.path.abspath(source_file))
+        command = by_file.get(path)
+        directory = os.path.dirname(path)
+        while command is None:
+            command = by_directory.get(directory)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        groups.setdefault(command.environment if command else fallback, []).append(source_file)
+    return groups
+
+
+def make_batches(source_files: List[str], commands: List[CompileCommand],
+                 options: batch.BatchOptions) -> List[Tuple[batch.BatchOptions, List[str]]]:
+    """Returns a batch per set of analysis arguments, adding them to the given options"""
+    batches = []
+    for (include_paths, clang_args), group in assign_environments(source_files, commands).items():
+        group_options = copy.copy(options)
+        group_options.include_paths = list(options.include_paths or []) + list(include_paths)
+        group_options.clang_args = options.clang_args + list(clang_args)
+        # Each batch precompiles its own header, since the arguments it's built with differ
+        group_options.precompiled_header_file = None
+        batches.append((group_options, group))
+    return batches
+
+
+def run_scan(command: str, source_files: List[str], compile_commands_path: str,
+             options: batch.BatchOptions) -> batch.BatchResults:
+    """Runs a command for every source file, with the arguments the compilation database gives it"""
+    commands = load_compile_commands(compile_commands_path)
+    return batch.run_batches(command, make_batches(source_files, commands, options))
@@ -0,0 +1,221 @@
+import concurrent.futures
+import concurrent.futures.process
+import contextlib
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import List, Tuple
+
+from codegen import client
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Commands that can't run inside a server worker
+unsupported_commands = ('serve', 'watch')
+
+# Seconds between checks for the idle timeout and stop requests
+poll_interval = 0.5
+
+
+def warm_up_worker() -> None:
+    # Workers import everything a request needs up front, so that the first request doesn't pay for it
+    from codegen import cli
+    import clang.cindex
+    import mako.lookup
+
+
+def handle_request(argv: List[str], cwd: str) -> Tuple[int, str, str]:
+    """
+    Runs a command line in a worker process, and returns its exit code and output. Workers are reused between
+    requests, so libclang, compiled templates and file hashes stay loaded.
+    """
+    from codegen import cli
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    previous_cwd = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                # Requests already run concurrently, and workers can't start workers of their own
+                returncode = cli.main(argv + ['--jobs', '1'])
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                traceback.print_exc()
+                returncode = 1
+    finally:
+        os.chdir(previous_cwd)
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+class Server(object):
+    """Answers client requests with a pool of worker processes, until stopped or idle for idle_timeout seconds"""
+    def __init__(self, jobs: int, idle_timeout: float) -> None:
+        self.jobs = jobs if jobs > 0 else os.cpu_count() or 1
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        # Connections being handled, and when the last one finished
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.stopping = threading.Event()
+        self.executor = self.create_executor()
+
+    def create_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        # Workers are spawned rather than forked, since forking a process with threads running isn't safe
+        executor = concurrent.futures.ProcessPoolExecutor(self.jobs, multiprocessing.get_context('spawn'))
+        for _ in range(self.jobs):
+            executor.submit(warm_up_worker)
+        return executor
+
+    def run_request(self, argv: List[str], cwd: str) -> dict:
+        if argv and argv[0].lower() in unsupported_commands:
+            return {'returncode': 1, 'stdout': '', 'stderr': '%s is not supported through the server\n' % argv[0]}
+
+        # A request is tried a second time on a fresh pool, since the worker that broke the first one may have died
+        # running another request
+        for attempt in range(2):
+            with self.lock:
+                executor = self.executor
+            try:
+                returncode, stdout, stderr = executor.submit(handle_request, argv, cwd).result()
+                break
+            except concurrent.futures.process.BrokenProcessPool:
+                # A worker died, such as from libclang crashing on a file
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = self.create_executor()
+                executor.shutdown(wait=False)
+                returncode, stdout, stderr = 1, '', 'The server worker running this command died\n'
+            except Exception:
+                returncode, stdout, stderr = 1, '', traceback.format_exc()
+                break
+        return {'returncode': returncode, 'stdout': stdout, 'stderr': stderr}
+
+    def handle_connection(self, connection: socket.socket) -> None:
+        try:
+            request = client.receive_message(connection)
+            if request.get('stop'):
+                self.stopping.set()
+                response = {'stopped': True}
+            else:
+                response = self.run_request(request['argv'], request['cwd'])
+            client.send_message(connection, response)
+        except (ValueError, KeyError):
+            # The client sent something we don't understand. Answer anyway, so that it isn't left guessing.
+            with contextlib.suppress(OSError):
+                client.send_message(connection, {'returncode': 1, 'stdout': '',
+                                                 'stderr': 'The server could not read the request\n'})
+        except OSError:
+            # The client went away, so there's no one to answer
+            pass
+        finally:
+            connection.close()
+            with self.lock:
+                self.active -= 1
+                self.last_activity = time.monotonic()
+
+    def is_idle(self) -> bool:
+        with self.lock:
+            return self.active == 0 and time.monotonic() - self.last_activity > self.idle_timeout
+
+    def serve(self, listener: socket.socket) -> None:
+        listener.settimeout(poll_interval)
+        while not self.stopping.is_set() and not self.is_idle():
+            try:
+                connection, _ = listener.accept()
+            except socket.timeout:
+                continue
+            self.start_connection(connection)
+
+    def accept_queued(self, listener: socket.socket) -> None:
+        """Handles the connections the listener has queued up, which would otherwise be dropped when it's closed"""
+        listener.setblocking(False)
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except (BlockingIOError, socket.timeout):
+                return
+            self.start_connection(connection)
+
+    def start_connection(self, connection: socket.socket) -> None:
+        connection.settimeout(None)
+        with self.lock:
+            self.active += 1
+        threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+
+    def shut_down(self) -> None:
+        # Let connections that are already being handled finish
+        while True:
+            with self.lock:
+                if self.active == 0:
+                    break
+            time.sleep(0.01)
+        self.executor.shutdown()
+
+
+@contextlib.contextmanager
+def _exclusive_lock(lock_path: str):
+    """Yields whether this process got the lock. Without fcntl, binding the socket is what keeps servers apart."""
+    if fcntl is None:
+        yield True
+        return
+
+    with open(lock_path, 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True
+
+
+def run_server(socket_path: str, jobs: int = 0, idle_timeout: float = 600.0, log=sys.stderr) -> int:
+    """Serves requests on a Unix domain socket until stopped or idle. Only one server runs per socket."""
+    if not hasattr(socket, 'AF_UNIX'):
+        log.write('The server needs Unix domain sockets, which this platform does not support\n')
+        return 1
+
+    with _exclusive_lock(socket_path + '.lock') as locked:
+        if not locked:
+            log.write('A server is already running on %s\n' % socket_path)
+            return 0
+
+        # A socket file left behind by a server that was killed would keep us from binding
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the user running the server may connect to it
+        previous_umask = os.umask(0o077)
+        try:
+            listener.bind(socket_path)
+        finally:
+            os.umask(previous_umask)
+        listener.listen(128)
+
+        server = Server(jobs, idle_timeout)
+        signal.signal(signal.SIGTERM, lambda *_: server.stopping.set())
+        log.write('Serving on %s with %d workers\n' % (socket_path, server.jobs))
+        log.flush()
+        try:
+            server.serve(listener)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # New clients start a new server from here on, while the ones that already connected are still answered
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
+            server.accept_queued(listener)
+            listener.close()
+            server.shut_down()
+    return 0
@@ -0,0 +1,253 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import codegen
+from codegen import cache
+from codegen.fileutil import write_file_atomic
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Size cap of a store that was never given one
+default_max_size = 1 << 30
+
+# When the store outgrows its cap, old entries are evicted until it is down to this fraction of the cap, so that
+# eviction doesn't have to run again on the very next store
+eviction_target = 0.9
+
+_size_suffixes = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(text: str) -> int:
+    """Parses a size such as 500M or 2G into bytes"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', text, re.IGNORECASE)
+    if match is None:
+        raise ValueError('Invalid size: %s' % text)
+    return int(float(match.group(1)) * _size_suffixes[match.group(2).upper()])
+
+
+def format_size(size: int) -> str:
+    for suffix in ('T', 'G', 'M', 'K'):
+        if size >= _size_suffixes[suffix]:
+            return '%.1f %sB' % (size / _size_suffixes[suffix], suffix)
+    return '%d B' % size
+
+
+def normalize_args(clang_args: Iterable[str]) -> List[str]:
+    """Makes include paths absolute, so that build trees that spell them differently still share entries"""
+    normalized = []
+    for arg in clang_args:
+        if arg.startswith('-I') and len(arg) > 2:
+            arg = '-I' + os.path.normpath(os.path.abspath(arg[2:]))
+        normalized.append(arg)
+    return normalized
+
+
+def compute_model_key(source_file: str, clang_args: Iterable[str]) -> str:
+    """
+    Returns the store key of a source file's analysis model. It's the local analysis key, computed from the arguments
+    with their include paths made absolute, so that build trees spelling them differently share entries.
+    """
+    return cache.compute_analysis_key(source_file, normalize_args(clang_args))
+
+
+def compute_output_key(model: dict, template_hash: str, include_file: str, unity_fragment: bool = False) -> str:
+    """
+    Returns the store key of generated code. It depends on the analysis model rather than its key, so that it's the
+    same however the model was produced, along with the template, the path the generated code includes and whether
+    it's a fragment of a unity chunk.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(('%s\n%s\n%s\n%d\n' % (codegen.__version__, template_hash, include_file,
+                                          unity_fragment)).encode('utf-8'))
+    hasher.update(json.dumps(model, sort_keys=True).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class ResultStore(object):
+    """
+    Content addressable store of analysis models and generated code, that can be shared by any number of build trees
+    and processes. Entries are written atomically, so they can be read without locking; bookkeeping and eviction
+    happen under a lock file. Hits and misses are counted in memory, and only added to the statistics by
+    flush_stats() or the next store, so that lookups never wait on the lock. The store is kept under a size cap by
+    evicting the least recently used entries. The cap is recorded along with the store's statistics, so it applies to
+    every process using the store, including ones that don't give a cap of their own.
+    """
+    def __init__(self, directory: str, max_size: Optional[int] = None) -> None:
+        self.directory = directory
+        self.objects_directory = os.path.join(directory, 'objects')
+        self.stats_filename = os.path.join(directory, 'stats.json')
+        self.lock_filename = os.path.join(directory, 'lock')
+        # Counts of this process not yet added to the statistics
+        self.pending_stats: Dict[str, int] = {}
+        os.makedirs(self.objects_directory, exist_ok=True)
+        recorded_max_size = self.read_stats()['max_size']
+        self.max_size = max_size if max_size is not None else recorded_max_size
+        if self.max_size != recorded_max_size:
+            # Recorded right away, so that the statistics and processes without a cap of their own go by it
+            self.enforce_max_size(self.update_stats())
+
+    def get_filename(self, key: str, kind: str) -> str:
+        return os.path.join(self.objects_directory, key[:2], '%s.%s' % (key, kind))
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        """Holds an exclusive lock on the store's bookkeeping, shared by every process using the store"""
+        with open(self.lock_filename, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def read_stats(self) -> Dict[str, int]:
+        stats = {'size': 0, 'entries': 0, 'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0,
+                 'max_size': default_max_size}
+        try:
+            with open(self.stats_filename, 'r') as f:
+                stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return stats
+
+    def update_stats(self, **deltas: int) -> Dict[str, int]:
+        with self.lock():
+            return self._add_stats(deltas)
+
+    def _add_stats(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """Adds to the statistics, along with the pending counts. Only called with the lock held."""
+        stats = self.read_stats()
+        for name, delta in list(deltas.items()) + list(self.pending_stats.items()):
+            stats[name] += delta
+        self.pending_stats.clear()
+        stats['max_size'] = self.max_size
+        write_file_atomic(self.stats_filename, json.dumps(stats))
+        return stats
+
+    def count(self, name: str) -> None:
+        self.pending_stats[name] = self.pending_stats.get(name, 0) + 1
+
+    def flush_stats(self) -> None:
+        """Adds the hits and misses counted so far to the statistics"""
+        if self.pending_stats:
+            self.update_stats()
+
+    def contains(self, key: str, kind: str) -> bool:
+        return os.path.exists(self.get_filename(key, kind))
+
+    def load(self, key: str, kind: str) -> Optional[str]:
+        filename = self.get_filename(key, kind)
+        try:
+            with open(filename, 'r') as f:
+                text = f.read()
+            # The mtime marks when an entry was last used, which is what eviction goes by
+            os.utime(filename)
+        except OSError:
+            self.count('misses')
+            return None
+        self.count('hits')
+        return text
+
+    def store(self, key: str, kind: str, text: str) -> None:
+        filename = self.get_filename(key, kind)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Replacing the entry and accounting for it happen together, so that processes storing the same entry at the
+        # same time don't both count it as new
+        with self.lock():
+            try:
+                previous_size = os.path.getsize(filename)
+            except OSError:
+                previous_size = None
+            write_file_atomic(filename, text)
+
+            size = os.path.getsize(filename)
+            stats = self._add_stats({'size': size - (previous_size or 0),
+                                     'entries': 0 if previous_size is not None else 1, 'stores': 1})
+        self.enforce_max_size(stats)
+
+    def enforce_max_size(self, stats: Dict[str, int]) -> None:
+        if stats['size'] > self.max_size:
+            self.evict(int(self.max_size * eviction_target))
+
+    def load_model(self, key: str) -> Optional[dict]:
+        text = self.load(key, 'model')
+        try:
+            return json.loads(text) if text is not None else None
+        except ValueError:
+            return None
+
+    def store_model(self, key: str, data: dict) -> None:
+        self.store(key, 'model', json.dumps(data))
+
+    def load_output(self, key: str) -> Optional[str]:
+        return self.load(key, 'output')
+
+    def store_output(self, key: str, text: str) -> None:
+        self.store(key, 'output', text)
+
+    def evict(self, target_size: int) -> None:
+        """Removes the least recently used entries until the store is no larger than target_size"""
+        with self.lock():
+            entries = []
+            for directory, _, filenames in os.walk(self.objects_directory):
+                for filename in filenames:
+                    file_path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, file_path))
+
+            # Recount while we're at it, so sizes recorded by processes that were killed mid-update don't accumulate
+            size = sum(entry[1] for entry in entries)
+            evicted = 0
+            for _, entry_size, file_path in sorted(entries):
+                if size <= target_size:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    continue
+                size -= entry_size
+                evicted += 1
+
+            stats = self.read_stats()
+            stats['size'] = size
+            stats['entries'] = len(entries) - evicted
+            stats['evictions'] += evicted
+            stats['max_size'] = self.max_size
+            write_file_atomic(self.stats_filename, json.dumps(stats))
+
+    def clear(self) -> None:
+        self.evict(0)
+
+    def format_stats(self) -> str:
+        stats = self.read_stats()
+        lookups = stats['hits'] + stats['misses']
+        lines = [
+            'Store directory: %s' % self.directory,
+            'Entries:         %d' % stats['entries'],
+            'Size:            %s' % format_size(stats['size']),
+            'Size cap:        %s' % format_size(self.max_size),
+            'Hits:            %d' % stats['hits'],
+            'Misses:          %d' % stats['misses'],
+            'Hit rate:        %.1f%%' % (100.0 * stats['hits'] / lookups if lookups else 0.0),
+            'Stores:          %d' % stats['stores'],
+            'Evictions:       %d' % stats['evictions'],
+        ]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,84 @@
+import hashlib
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+# Only the version is needed up front. The compiler is imported when a template is first loaded, since it takes longer
+# to import than a cache hit takes altogether.
+import mako
+
+from codegen import timing
+
+if TYPE_CHECKING:
+    import mako.template
+
+# Template used when the caller doesn't supply their own, and the directory of the built-in template sections
+default_template_path = os.path.normpath(os.path.join(os.path.dirname(__file__), 'data', 'template.mako'))
+default_template_directory = os.path.dirname(default_template_path)
+
+# Templates compiled by this process, keyed by template path and cache path, along with the template's mtime
+_loaded_templates: Dict[Tuple[str, Optional[str]], Tuple[float, 'mako.template.Template']] = {}
+
+
+def get_template_directories(template_path: str) -> List[str]:
+    """Returns where a template's sections are looked up: next to the template, then among the built-in sections"""
+    return list(dict.fromkeys([os.path.dirname(os.path.abspath(template_path)), default_template_directory]))
+
+
+def get_template_hash(template_path: Optional[str] = None, sections: Iterable[str] = ()) -> str:
+    """
+    Returns a hash of the contents of the template and the sections it includes, and the mako version, which together
+    determine what it renders
+    """
+    template_path = template_path or default_template_path
+    hasher = hashlib.sha256()
+    hasher.update(mako.__version__.encode('utf-8'))
+    with open(template_path, 'rb') as f:
+        hasher.update(f.read())
+    directories = get_template_directories(template_path)
+    for section in sections:
+        hasher.update(section.encode('utf-8'))
+        section_path = next((os.path.join(directory, section) for directory in directories
+                             if os.path.isfile(os.path.join(directory, section))), None)
+        if section_path is not None:
+            with open(section_path, 'rb') as f:
+                hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+def get_module_directory(template_path: str, cache_path: str) -> str:
+    """
+    Returns the directory that compiled python modules of a template are kept in. mako names each module after the file
+    it was compiled from, so the directory is keyed by the contents of the template and of every section it can look
+    up, and by the lookup directories. That's on top of the mtime check that mako already does against the module.
+    """
+    directories = get_template_directories(template_path)
+    sections = sorted({name for directory in directories for name in os.listdir(directory) if name.endswith('.mako')})
+    hasher = hashlib.sha256(get_template_hash(template_path, sections).encode('utf-8'))
+    for directory in directories:
+        hasher.update(b'\0' + directory.encode('utf-8'))
+    return os.path.join(cache_path, 'templates', hasher.hexdigest()[:16])
+
+
+def get_template(template_path: Optional[str] = None, cache_path: Optional[str] = None) -> 'mako.template.Template':
+    """
+    Returns a compiled template. Each template is only compiled once per process. With a cache path, the compiled
+    module is also written to disk so that later processes can load it rather than compiling the template again.
+    """
+    template_path = os.path.abspath(template_path or default_template_path)
+    key = (template_path, cache_path)
+    mtime = os.path.getmtime(template_path)
+
+    loaded = _loaded_templates.get(key)
+    if loaded is not None and loaded[0] == mtime:
+        return loaded[1]
+
+    template_name = os.path.basename(template_path)
+    module_directory = get_module_directory(template_path, cache_path) if cache_path else None
+    with timing.phase('load_template'):
+        import mako.lookup
+        lookup = mako.lookup.TemplateLookup(directories=get_template_directories(template_path),
+                                            module_directory=module_directory)
+        template = lookup.get_template('/' + template_name)
+
+    _loaded_templates[key] = (mtime, template)
+    return template
@@ -0,0 +1,128 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class TimingEvent(object):
+    """A timed phase of work, optionally attributed to a source file"""
+    __slots__ = ('name', 'source_file', 'start', 'duration', 'pid')
+
+    def __init__(self, name: str, source_file: Optional[str], start: float, duration: float, pid: int) -> None:
+        self.name = name
+        self.source_file = source_file
+        # Wall clock time, so events from different processes line up
+        self.start = start
+        self.duration = duration
+        self.pid = pid
+
+
+class Timings(object):
+    """Phase timings and counters recorded while processing source files"""
+    def __init__(self) -> None:
+        self.events: List[TimingEvent] = []
+        self.counters: Dict[str, int] = {}
+
+    def add_event(self, name: str, source_file: Optional[str], start: float, duration: float) -> None:
+        self.events.append(TimingEvent(name, source_file, start, duration, os.getpid()))
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other: 'Timings') -> None:
+        self.events.extend(other.events)
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+
+    def get_summary(self) -> dict:
+        """Returns per-file and overall phase times in seconds, with the slowest files first"""
+        files: Dict[str, Dict[str, float]] = {}
+        phases: Dict[str, float] = {}
+        for event in self.events:
+            if event.name == 'file':
+                continue
+            phases[event.name] = phases.get(event.name, 0.0) + event.duration
+            if event.source_file is not None:
+                file_phases = files.setdefault(event.source_file, {})
+                file_phases[event.name] = file_phases.get(event.name, 0.0) + event.duration
+
+        file_totals = {event.source_file: event.duration for event in self.events if event.name == 'file'}
+        ordered_files = sorted(file_totals, key=lambda source_file: file_totals[source_file], reverse=True)
+        return {
+            'files': {
+                source_file: {'total': file_totals[source_file], 'phases': files.get(source_file, {})}
+                for source_file in ordered_files
+            },
+            'phases': phases,
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def get_trace(self) -> dict:
+        """Returns the events in the Chrome trace event format, with one row per process"""
+        origin = min((event.start for event in self.events), default=0.0)
+        trace_events = []
+        for event in self.events:
+            trace_event = {
+                'name': os.path.basename(event.source_file) if event.name == 'file' else event.name,
+                'cat': 'codegen',
+                'ph': 'X',
+                'ts': (event.start - origin) * 1e6,
+                'dur': event.duration * 1e6,
+                'pid': event.pid,
+                'tid': event.pid,
+            }
+            if event.source_file is not None:
+                trace_event['args'] = {'file': event.source_file}
+            trace_events.append(trace_event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write_summary(self, file_path: str) -> None:
+        with open(file_path, 'w') as f:
+            json.dump(self.get_summary(), f, indent=2)
+
+    def write_trace(self, file_path: str) -> None:
+        with open(file_path, 'w') as f:
+            json.dump(self.get_trace(), f)
+
+
+# Timings being recorded by the current thread, if any
+_local = threading.local()
+
+
+def get_active() -> Optional[Timings]:
+    return getattr(_local, 'timings', None)
+
+
+@contextlib.contextmanager
+def recording(timings: Optional[Timings]) -> Iterator[Optional[Timings]]:
+    """Makes phases and counters of the current thread get recorded into timings while the context is active"""
+    previous = get_active()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+@contextlib.contextmanager
+def phase(name: str, source_file: Optional[str] = None) -> Iterator[None]:
+    """Times a phase of work. Does nothing unless timings are being recorded."""
+    timings = get_active()
+    if timings is None:
+        yield
+        return
+
+    start = time.time()
+    start_counter = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_event(name, source_file, start, time.perf_counter() - start_counter)
+
+
+def count(name: str, amount: int = 1) -> None:
+    timings = get_active()
+    if timings is not None:
+        timings.count(name, amount)
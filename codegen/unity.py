@@ -0,0 +1,115 @@
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List
+
+from codegen import codegen
+from codegen.fileutil import write_file_if_changed
+
+# Extension of the per-source file fragments that unity chunks include. It mustn't be a source file extension, so
+# build systems don't compile fragments on their own.
+fragment_extension = 'inl'
+
+
+def get_chunk_index(source_file: str, source_root: str, chunk_count: int) -> int:
+    """
+    Returns the chunk that a source file's generated code goes into. It only depends on the path of the source file
+    relative to the source root, so adding, removing or editing other source files never moves it to another chunk.
+    """
+    relpath = os.path.relpath(os.path.abspath(source_file), source_root).replace(os.sep, '/')
+    return zlib.crc32(relpath.encode('utf-8')) % chunk_count
+
+
+def get_chunk_file(output_root: str, chunk_index: int) -> str:
+    return os.path.join(output_root, 'codegen_unity_%d.cpp' % chunk_index)
+
+
+def get_chunk_files(output_root: str, chunk_count: int) -> List[str]:
+    return [get_chunk_file(output_root, chunk_index) for chunk_index in range(chunk_count)]
+
+
+def get_chunk_names_file(chunk_file: str) -> str:
+    """Returns the file holding the name pool of a chunk, which the chunk includes ahead of its fragments"""
+    return '%s_names.%s' % (os.path.splitext(chunk_file)[0], fragment_extension)
+
+
+def render_chunk(chunk_file: str, fragment_files: Iterable[str]) -> str:
+    lines = ['// Generated by codegen. Includes the reflection code of every source file assigned to this chunk.\n']
+    lines.append('#include "%s"\n' % os.path.basename(get_chunk_names_file(chunk_file)))
+    lines += ['#include "%s"\n' % fragment_file.replace(os.sep, '/') for fragment_file in sorted(fragment_files)]
+    return ''.join(lines)
+
+
+def read_chunk_fragments(chunk_file: str) -> List[str]:
+    """Returns the fragment files that a chunk includes"""
+    names_include = os.path.basename(get_chunk_names_file(chunk_file))
+    with open(chunk_file, 'r') as f:
+        includes = re.findall(r'^#include "(.*)"$', f.read(), re.M)
+    # Includes are looked up next to the chunk first, like the compiler does. Chunks of a relative output root refer to
+    # their fragments relative to the working directory instead, which is on the include path then.
+    directory = os.path.dirname(chunk_file)
+    fragment_files = []
+    for include in includes:
+        if include != names_include:
+            fragment_file = os.path.join(directory, include)
+            fragment_files.append(fragment_file if os.path.exists(fragment_file) else include)
+    return fragment_files
+
+
+def render_chunk_names(chunk_file: str, fragment_files: Iterable[str]) -> str:
+    """
+    Renders the name pool of a chunk, holding every name that its fragments refer to. Fragments that haven't been
+    generated yet are left out; the chunk can't be compiled without them anyway.
+    """
+    names = []
+    for fragment_file in fragment_files:
+        try:
+            with open(fragment_file, 'r') as f:
+                names += codegen.UnityNamePool.ReferencePattern.findall(f.read())
+        except OSError:
+            continue
+    return ('// Generated by codegen. Names of the enum constants of every fragment included by %s.\n'
+            '#include <cstdint>\n\n%s' % (os.path.basename(chunk_file), codegen.UnityNamePool.GenerateChunkText(names)))
+
+
+def write_chunk_names(chunk_file: str) -> bool:
+    """
+    Writes the name pool of a chunk, from the fragments it includes. It has to be written again whenever one of them
+    changes. Returns whether the file changed.
+    """
+    return write_file_if_changed(get_chunk_names_file(chunk_file),
+                                 render_chunk_names(chunk_file, read_chunk_fragments(chunk_file)))
+
+
+def group_fragments(
+        source_outputs: Dict[str, List[str]],
+        source_root: str,
+        chunk_count: int
+) -> List[List[str]]:
+    """Returns the fragment files of every chunk, given the fragments generated for each source file"""
+    chunks: List[List[str]] = [[] for _ in range(chunk_count)]
+    for source_file, fragment_files in source_outputs.items():
+        if fragment_files:
+            chunks[get_chunk_index(source_file, source_root, chunk_count)].extend(fragment_files)
+    return chunks
+
+
+def write_chunks(
+        source_outputs: Dict[str, List[str]],
+        source_root: str,
+        output_root: str,
+        chunk_count: int
+) -> List[str]:
+    """
+    Writes every chunk file, including empty ones so that the set of files to compile never changes, along with the
+    name pool of each one from the fragments generated so far. Files are only rewritten when their contents change.
+    Returns the files that were written.
+    """
+    changed_files = []
+    for chunk_index, fragment_files in enumerate(group_fragments(source_outputs, source_root, chunk_count)):
+        chunk_file = get_chunk_file(output_root, chunk_index)
+        if write_file_if_changed(chunk_file, render_chunk(chunk_file, fragment_files)):
+            changed_files.append(chunk_file)
+        if write_chunk_names(chunk_file):
+            changed_files.append(get_chunk_names_file(chunk_file))
+    return changed_files
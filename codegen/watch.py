@@ -0,0 +1,279 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from codegen import batch
+from codegen import codegen
+from codegen import pch
+
+# Extensions of the files that are watched when no manifest is given
+header_extensions = ('.h', '.hh', '.hpp', '.hxx')
+
+# Seconds to wait for more changes after one is seen, so that a save touching several files is handled in one go
+settle_time = 0.05
+
+
+class PollingWatcher(object):
+    """Finds changed files by periodically comparing the mtime and size of every file under a directory"""
+    def __init__(self, root: str, interval: float = 0.5) -> None:
+        self.root = root
+        self.interval = interval
+        self.stamps = self.scan()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        stamps = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                file_path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                stamps[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Blocks until files change or the timeout expires, and returns the paths of the files that changed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stamps = self.scan()
+            changed = {file_path for file_path in stamps.keys() | self.stamps.keys()
+                       if stamps.get(file_path) != self.stamps.get(file_path)}
+            self.stamps = stamps
+            if changed:
+                return changed
+
+            remaining = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return set()
+            time.sleep(remaining)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(object):
+    """Finds changed files with inotify, watching every directory under a root. Only available on Linux."""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    IN_Q_OVERFLOW = 0x00004000
+
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    event_header = struct.Struct('iIII')
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # Watched directory of every watch descriptor
+        self.directories: Dict[int, str] = {}
+        self.add_tree(root)
+
+    def add_tree(self, root: str) -> None:
+        for directory, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for %s' % directory)
+            self.directories[wd] = directory
+
+    def read_events(self) -> Set[str]:
+        changed = set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = self.event_header.unpack_from(data, offset)
+            offset += self.event_header.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were lost, so every file may have changed
+                changed.update(PollingWatcher(self.root).stamps)
+                continue
+
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            file_path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(file_path)
+                    changed.update(PollingWatcher(file_path).stamps)
+            else:
+                changed.add(file_path)
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Blocks until files change or the timeout expires, and returns the paths of the files that changed"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        return self.read_events()
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def create_watcher(root: str, poll: bool = False, poll_interval: float = 0.5):
+    """Returns an inotify watcher where it's available, and a polling watcher otherwise"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, poll_interval)
+
+
+def find_source_files(source_root: str, output_root: str) -> List[str]:
+    """Returns every header under the source root, leaving out generated files under the output root"""
+    output_root = os.path.abspath(output_root)
+    source_files = []
+    for directory, directory_names, filenames in os.walk(source_root):
+        # Sorted in place, so that os.walk visits directories in the same order everywhere
+        directory_names[:] = sorted(name for name in directory_names
+                                    if os.path.abspath(os.path.join(directory, name)) != output_root)
+        source_files += [os.path.join(directory, filename) for filename in sorted(filenames)
+                         if filename.endswith(header_extensions)]
+    return source_files
+
+
+class Watch(object):
+    """
+    Keeps every source file's translation unit warm, and regenerates the outputs of source files as they or the headers
+    they include change. Changed files are reparsed rather than parsed from scratch.
+    """
+    def __init__(self, source_files: Optional[List[str]], options: batch.BatchOptions, log: TextIO = sys.stderr) -> None:
+        self.options = options
+        self.log = log
+        self.context = batch.BatchContext(options, keep_translation_units=True)
+        # Watch every header under the source root unless we were given a fixed set of files
+        self.fixed_source_files = source_files is not None
+        self.source_files: Dict[str, str] = {}
+        for source_file in (source_files if source_files is not None
+                            else find_source_files(options.source_root, options.output_root)):
+            self.source_files[os.path.abspath(source_file)] = source_file
+        self.outputs: Dict[str, List[str]] = {}
+        # Headers included by each source file, which regenerate it when they change
+        self.dependencies: Dict[str, Set[str]] = {}
+
+    def generate(self, source_files: Iterable[str], report: bool = True) -> None:
+        for source_file in source_files:
+            start = time.perf_counter()
+            result = batch.run_file(self.context, 'generate', source_file)
+            elapsed = (time.perf_counter() - start) * 1000
+            if result.error is not None:
+                self.log.write('Error processing %s:\n%s' % (source_file, result.error))
+                continue
+
+            self.outputs[source_file] = result.output_files
+            self.dependencies[source_file] = set(result.dependencies)
+            for output_file in result.changed_files if report else []:
+                self.log.write('Regenerated %s (%.1f ms)\n' % (output_file, elapsed))
+        if self.context.result_store is not None:
+            self.context.result_store.flush_stats()
+
+        if self.options.unity_chunks:
+            results = batch.BatchResults()
+            results.outputs = self.outputs
+            batch.write_unity_chunks(results, self.options)
+            for chunk_file in results.changed if report else []:
+                self.log.write('Updated %s\n' % chunk_file)
+
+    def precompiled_header_changed(self, changed_paths: Set[str]) -> bool:
+        """Returns whether any of the files the precompiled header was built from changed"""
+        options = self.options
+        pch_files = {os.path.abspath(header) for header in options.pch_headers}
+        if options.precompiled_header_file is not None:
+            pch_files.update(pch.get_included_files(options.precompiled_header_file))
+        return not changed_paths.isdisjoint(pch_files)
+
+    def on_changed(self, changed_paths: Set[str]) -> None:
+        if self.precompiled_header_changed(changed_paths):
+            # Every translation unit was built on top of the old precompiled header. Dropping it makes the next parse
+            # rebuild it, now that the files it was built from changed.
+            self.log.write('Precompiled header changed; reparsing every source file\n')
+            self.options.precompiled_header_file = None
+            self.context.translation_units = codegen.TranslationUnitCache()
+            self.generate(list(self.source_files.values()))
+            return
+
+        output_root = os.path.abspath(self.options.output_root) + os.sep
+        to_generate = []
+        removed = False
+        for changed_path in sorted(changed_paths):
+            to_generate += [source_file for source_file, dependencies in self.dependencies.items()
+                            if changed_path in dependencies and source_file not in to_generate]
+
+            source_file = self.source_files.get(changed_path)
+            if source_file is None:
+                # New headers are picked up too, unless we were given a fixed set of files
+                if self.fixed_source_files or not changed_path.endswith(header_extensions) or \
+                        changed_path.startswith(output_root) or not os.path.exists(changed_path):
+                    continue
+                source_file = self.source_files[changed_path] = changed_path
+
+            if os.path.exists(source_file):
+                if source_file not in to_generate:
+                    to_generate.append(source_file)
+            else:
+                # Deleted; its generated files are left alone, like a build would
+                self.context.translation_units.Release(source_file)
+                self.outputs.pop(source_file, None)
+                self.dependencies.pop(source_file, None)
+                removed = True
+                if not self.fixed_source_files:
+                    del self.source_files[changed_path]
+
+        if to_generate or removed:
+            self.generate([source_file for source_file in to_generate if os.path.exists(source_file)])
+
+    def run(self, watcher) -> None:
+        start = time.perf_counter()
+        self.generate(list(self.source_files.values()), report=False)
+        self.log.write('Watching %d source files under %s (warm-up took %.1f s)\n' % (
+            len(self.source_files), self.options.source_root, time.perf_counter() - start))
+        self.log.flush()
+
+        while True:
+            changed_paths = watcher.wait()
+            while True:
+                more_paths = watcher.wait(settle_time)
+                if not more_paths:
+                    break
+                changed_paths |= more_paths
+
+            self.on_changed({os.path.abspath(changed_path) for changed_path in changed_paths})
+            self.log.flush()
+
+
+def run_watch(
+        source_files: Optional[List[str]],
+        options: batch.BatchOptions,
+        poll: bool = False,
+        poll_interval: float = 0.5
+) -> int:
+    """Watches the source root and regenerates outputs on every change, until interrupted"""
+    watcher = create_watcher(options.source_root, poll, poll_interval)
+    try:
+        Watch(source_files, options).run(watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
@@ -1,12 +1,121 @@
 #ifndef CODEGEN_ENUMREFLECTION_H
 #define CODEGEN_ENUMREFLECTION_H
 
+#include <cstdint>
 #include <cstring>
 #include <ctype.h>
 #include <type_traits>
-#include <map>
 
-typedef std::map<int, const char*> CEnumNameMap;
+/**
+ *  Enum constant names are stored once per generated file, in a pool of null-terminated names, and tables refer to
+ *  them by their offset into the pool. This is the offset of a name that doesn't exist.
+ */
+const uint32_t kNoEnumName = 0xFFFFFFFF;
+
+/** Entry of a table that maps enum values to their names */
+struct CEnumNameMapEntry
+{
+    int first;
+    uint32_t NameOffset;
+};
+
+/** An enum value and its name, as seen through a CEnumNameMap iterator */
+struct CEnumNameMapValue
+{
+    int first;
+    const char* second;
+};
+
+/** Iterator through a CEnumNameMap, which looks names up in the name pool as it goes */
+class CEnumNameMapIterator
+{
+    const CEnumNameMapEntry* mpkEntry;
+    const char* mpkNamePool;
+
+public:
+    /** Makes it->first and it->second work, even though the value they belong to is only made on demand */
+    struct CArrowProxy
+    {
+        CEnumNameMapValue Value;
+        inline const CEnumNameMapValue* operator->() const { return &Value; }
+    };
+
+    CEnumNameMapIterator(const CEnumNameMapEntry* pkEntry, const char* pkNamePool)
+        : mpkEntry(pkEntry), mpkNamePool(pkNamePool) {}
+
+    inline CEnumNameMapValue operator*() const
+    {
+        CEnumNameMapValue Value = { mpkEntry->first, mpkNamePool + mpkEntry->NameOffset };
+        return Value;
+    }
+
+    inline CArrowProxy operator->() const                               { CArrowProxy Proxy = { **this }; return Proxy; }
+    inline CEnumNameMapIterator& operator++()                           { mpkEntry++; return *this; }
+    inline CEnumNameMapIterator operator++(int)                         { CEnumNameMapIterator RetV = *this; mpkEntry++; return RetV; }
+    inline bool operator==(const CEnumNameMapIterator& kOther) const    { return mpkEntry == kOther.mpkEntry; }
+    inline bool operator!=(const CEnumNameMapIterator& kOther) const    { return mpkEntry != kOther.mpkEntry; }
+};
+
+/**
+ *  Table of enum values and their names, sorted by value. It points at constant-initialized arrays, so no
+ *  table needs to be built before main.
+ */
+struct CEnumNameMap
+{
+    typedef CEnumNameMapIterator const_iterator;
+
+    const CEnumNameMapEntry* pkEntries;
+    unsigned NumEntries;
+
+    /** Name pool of the generated file that the enum is reflected in */
+    const char* pkNamePool;
+
+    inline const_iterator begin() const     { return const_iterator(pkEntries, pkNamePool); }
+    inline const_iterator end() const       { return const_iterator(pkEntries + NumEntries, pkNamePool); }
+    inline const_iterator cbegin() const    { return begin(); }
+    inline const_iterator cend() const      { return end(); }
+    inline unsigned size() const            { return NumEntries; }
+
+    /** Returns the name at the given offset of the name pool, or nullptr for kNoEnumName */
+    inline const char* GetName(uint32_t Offset) const
+    {
+        return Offset != kNoEnumName ? pkNamePool + Offset : nullptr;
+    }
+
+    /** Returns the entry of the given value, or end() if there isn't one */
+    const_iterator find(int InValue) const
+    {
+        unsigned Low = 0;
+        unsigned High = NumEntries;
+
+        while (Low < High)
+        {
+            unsigned Mid = Low + (High - Low) / 2;
+
+            if (pkEntries[Mid].first == InValue)
+            {
+                return const_iterator(pkEntries + Mid, pkNamePool);
+            }
+            else if (pkEntries[Mid].first < InValue)
+            {
+                Low = Mid + 1;
+            }
+            else
+            {
+                High = Mid;
+            }
+        }
+
+        return end();
+    }
+};
+
+/** Entry of a table that maps enum constant names to their values */
+struct CEnumNameIndexEntry
+{
+    uint32_t NameOffset;
+    int Value;
+};
 
 /** Provides runtime information about enum types */
 template<typename T, typename = typename std::enable_if< std::is_enum<T>::value >::type>
@@ -18,6 +127,21 @@ class TEnumReflection
     /** Map that provides mapping between enum constants and their names */
     static const CEnumNameMap skNameMap;
 
+    /** Entries of skNameMap */
+    static const CEnumNameMapEntry skNameMapEntries[];
+
+    /** Enum constants sorted by name in strcmp order, for binary searching by name */
+    static const CEnumNameIndexEntry skNameIndex[];
+    static const unsigned skNameIndexSize;
+
+    /**
+     *  Name offsets of the values from skDenseFirst to skDenseFirst + skDenseSize - 1, with kNoEnumName for values that
+     *  have no constant. Only generated when the enum values are contiguous enough; otherwise skDenseSize is 0.
+     */
+    static const uint32_t skDenseNameOffsets[];
+    static const int skDenseFirst;
+    static const unsigned skDenseSize;
+
     /** Default "invalid" enum value */
     static const int skErrorValue;
 
@@ -25,6 +149,18 @@ public:
     /** Returns the name of the given enum value */
     inline static const char* ConvertValueToString(T InValue)
     {
+        // Unsigned arithmetic so that values below skDenseFirst wrap around and fail the bounds check
+        unsigned DenseIndex = (unsigned) (int) InValue - (unsigned) skDenseFirst;
+
+        if (DenseIndex < skDenseSize)
+        {
+            return skNameMap.GetName(skDenseNameOffsets[DenseIndex]);
+        }
+        else if (skDenseSize > 0)
+        {
+            return nullptr;
+        }
+
         auto FindIter = skNameMap.find((int) InValue);
 
         if (FindIter != skNameMap.end())
@@ -40,12 +176,25 @@ public:
     /** Returns the enum value corresponding to the given name */
     static T ConvertStringToValue(const char* InValue)
     {
-        //@todo this is slow
-        for (auto Iter = skNameMap.begin(); Iter != skNameMap.end(); Iter++)
+        unsigned Low = 0;
+        unsigned High = skNameIndexSize;
+
+        while (Low < High)
         {
-            if (strcmp(Iter->second, InValue) == 0)
+            unsigned Mid = Low + (High - Low) / 2;
+            int Compare = strcmp(skNameMap.pkNamePool + skNameIndex[Mid].NameOffset, InValue);
+
+            if (Compare == 0)
+            {
+                return (T) skNameIndex[Mid].Value;
+            }
+            else if (Compare < 0)
             {
-                return (T) Iter->first;
+                Low = Mid + 1;
+            }
+            else
+            {
+                High = Mid;
             }
         }
 
@@ -75,9 +224,7 @@ public:
 
     public:
         CIterator()
-        {
-            mInternalIterator = skNameMap.cbegin();
-        }
+            : mInternalIterator(skNameMap.cbegin()) {}
 
         inline T Value() const          { return (T) mInternalIterator->first; }
         inline const char* Name() const { return mInternalIterator->second; }
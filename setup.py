@@ -153,7 +153,7 @@ setup(
     # projects.
     extras_require={  # Optional
         'dev': [],
-        'test': [],
+        'test': ['pytest'],
     },
 
     # If there are data files included in your packages that need to be
@@ -0,0 +1,39 @@
+import importlib.util
+import os
+from typing import Optional
+
+import pytest
+
+
+def find_lib_clang() -> Optional[str]:
+    """Returns libclang from CODEGEN_LIBCLANG_PATH, or the one bundled with the libclang package if it's installed"""
+    path = os.environ.get('CODEGEN_LIBCLANG_PATH')
+    if path:
+        return path
+    spec = importlib.util.find_spec('clang')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    native = os.path.join(list(spec.submodule_search_locations)[0], 'native')
+    for filename in ('libclang.so', 'libclang.dylib', 'libclang.dll'):
+        if os.path.exists(os.path.join(native, filename)):
+            return os.path.join(native, filename)
+    return None
+
+
+@pytest.fixture(scope='session')
+def lib_clang_path() -> str:
+    path = find_lib_clang()
+    if path is None:
+        pytest.skip('libclang not found; set CODEGEN_LIBCLANG_PATH')
+    return path
+
+
+@pytest.fixture
+def write(tmp_path):
+    """Writes a file under the test's temporary directory, creating its directory, and returns its path"""
+    def write_file(relative_path: str, text: str) -> str:
+        path = tmp_path / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return str(path)
+    return write_file
@@ -0,0 +1,49 @@
+import os
+
+from codegen import batch
+
+
+def generate(lib_clang_path: str, root: str, source_files, aggregate_size: int) -> batch.BatchResults:
+    options = batch.BatchOptions([], lib_clang_path, root, os.path.join(root, 'out'),
+                                 cache_path=os.path.join(root, 'cache'), aggregate_size=aggregate_size)
+    results = batch.run_batch('generate', source_files, options)
+    assert not results.errors
+    return results
+
+
+def read_output(results: batch.BatchResults, source_file: str) -> str:
+    output_file, = results.outputs[source_file]
+    with open(output_file, 'r') as f:
+        return f.read()
+
+
+def test_macro_leaking_into_later_header(lib_clang_path, tmp_path, write):
+    # Analyzed on its own, Bar.h doesn't see the VALUE of Foo.h, which comes before it in the aggregate parse
+    write('common.h', '#pragma once\n#define BASE 10\n')
+    source_files = [write('Foo.h', '#include "common.h"\n#define VALUE 5\nenum class EFoo { A = VALUE + BASE };\n'),
+                    write('Bar.h', '#include "common.h"\n#ifndef VALUE\n#define VALUE 2\n#endif\n'
+                                   'enum class EBar { A = VALUE + BASE };\n')]
+    results = generate(lib_clang_path, str(tmp_path), source_files, 8)
+    assert '(int) 15,' in read_output(results, source_files[0])
+    assert '(int) 12,' in read_output(results, source_files[1])
+
+
+def test_aggregate_size_is_part_of_the_cache_key(lib_clang_path, tmp_path, write):
+    source_files = [write('Foo.h', 'enum class EFoo { A };\n'), write('Bar.h', 'enum class EBar { A };\n')]
+    # Models analyzed one header at a time aren't reused by an aggregate parse, nor the other way around
+    for aggregate_size in (0, 8):
+        options = batch.BatchOptions([], lib_clang_path, str(tmp_path), os.path.join(str(tmp_path), 'out'),
+                                     cache_path=os.path.join(str(tmp_path), 'cache'), aggregate_size=aggregate_size,
+                                     record_timings=True)
+        results = batch.run_batch('get_output_files', source_files, options)
+        assert results.timings.counters.get('analysis_cache_miss') == 2
+
+
+def test_declaration_leaking_into_later_header(lib_clang_path, tmp_path, write):
+    # Bar.h names the X of Foo.h without including it, so it's analyzed on its own, as without an aggregate parse
+    source_files = [write('Foo.h', 'constexpr int X = 5;\nenum class EFoo { A };\n'),
+                    write('Bar.h', 'struct SBar { enum class EBar { A = X }; };\n')]
+    aggregate_results = generate(lib_clang_path, str(tmp_path), source_files, 8)
+    assert '(int) 5,' not in read_output(aggregate_results, source_files[1])
+    results = generate(lib_clang_path, str(tmp_path), source_files, 0)
+    assert read_output(results, source_files[1]) == read_output(aggregate_results, source_files[1])
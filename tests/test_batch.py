@@ -0,0 +1,30 @@
+import os
+
+from codegen import batch
+
+
+def exit_on_crash_file(context: batch.BatchContext, source_file: str) -> batch.FileResult:
+    if os.path.basename(source_file) == 'Crash.h':
+        os._exit(1)
+    return batch.FileResult([source_file + '.cpp'])
+
+
+def test_worker_died(monkeypatch, tmp_path, write):
+    # Runs in forked workers, which inherit the patched command
+    monkeypatch.setitem(batch.batch_commands, 'exit_on_crash', exit_on_crash_file)
+    source_files = [write(name, '') for name in ('A.h', 'Crash.h', 'B.h', 'C.h', 'D.h')]
+    options = batch.BatchOptions([], '', str(tmp_path), os.path.join(str(tmp_path), 'out'), jobs=2)
+    results = batch.run_batch('exit_on_crash', source_files, options)
+    assert list(results.errors) == [source_files[1]]
+    assert 'Worker process died' in results.errors[source_files[1]]
+    assert list(results.outputs) == source_files[:1] + source_files[2:]
+
+
+def test_worker_died_in_group(monkeypatch, tmp_path, write):
+    # The group's other files are run again on their own, so only the file that kills its worker fails
+    monkeypatch.setitem(batch.batch_commands, 'exit_on_crash', exit_on_crash_file)
+    source_files = [write(name, '') for name in ('A.h', 'Crash.h', 'B.h', 'C.h', 'D.h')]
+    options = batch.BatchOptions([], '', str(tmp_path), os.path.join(str(tmp_path), 'out'), jobs=2, aggregate_size=4)
+    results = batch.run_batch('exit_on_crash', source_files, options)
+    assert list(results.errors) == [source_files[1]]
+    assert list(results.outputs) == source_files[:1] + source_files[2:]
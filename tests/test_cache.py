@@ -0,0 +1,49 @@
+import os
+
+from codegen import batch
+
+
+def run(lib_clang_path: str, root: str, command: str, source_files) -> batch.BatchResults:
+    options = batch.BatchOptions([], lib_clang_path, root, os.path.join(root, 'out'),
+                                 cache_path=os.path.join(root, 'cache'), record_timings=True)
+    results = batch.run_batch(command, source_files, options)
+    assert not results.errors
+    return results
+
+
+def read_output(results: batch.BatchResults, source_file: str) -> str:
+    output_file, = results.outputs[source_file]
+    with open(output_file, 'r') as f:
+        return f.read()
+
+
+def test_model_shared_between_commands(lib_clang_path, tmp_path, write):
+    source_file = write('Foo.h', 'enum class EFoo { A, B };\n')
+    results = run(lib_clang_path, str(tmp_path), 'get_output_files', [source_file])
+    assert results.timings.counters.get('analysis_cache_miss') == 1
+
+    # generate picks up the model that get_output_files analyzed, rather than parsing the header again
+    results = run(lib_clang_path, str(tmp_path), 'generate', [source_file])
+    assert results.timings.counters.get('analysis_cache_hit') == 1
+    assert 'analysis_cache_miss' not in results.timings.counters
+
+
+def test_changed_contents(lib_clang_path, tmp_path, write):
+    source_file = write('Foo.h', 'enum class EFoo { A = 1 };\n')
+    assert '(int) 1,' in read_output(run(lib_clang_path, str(tmp_path), 'generate', [source_file]), source_file)
+
+    write('Foo.h', 'enum class EFoo { A = 2 };\n')
+    assert '(int) 2,' in read_output(run(lib_clang_path, str(tmp_path), 'generate', [source_file]), source_file)
+
+
+def test_same_contents_in_different_directories(lib_clang_path, tmp_path, write):
+    # Both headers have the same contents and arguments, but include a different common.h
+    write('a/common.h', '#define VALUE 1\n')
+    write('b/common.h', '#define VALUE 2\n')
+    text = '#include "common.h"\nenum class EFoo { A = VALUE };\n'
+    source_files = [write('a/Foo.h', text), write('b/Foo.h', text)]
+
+    for _ in range(2):
+        results = run(lib_clang_path, str(tmp_path), 'generate', source_files)
+        assert '(int) 1,' in read_output(results, source_files[0])
+        assert '(int) 2,' in read_output(results, source_files[1])
@@ -0,0 +1,46 @@
+import os
+
+from codegen import batch
+
+
+def generate(lib_clang_path: str, root: str, source_files, **kwargs) -> batch.BatchResults:
+    options = batch.BatchOptions([], lib_clang_path, root, os.path.join(root, 'out'),
+                                 cache_path=os.path.join(root, 'cache'), write_depfiles=True, **kwargs)
+    results = batch.run_batch('generate', source_files, options)
+    assert not results.errors
+    return results
+
+
+def read_output(results: batch.BatchResults, source_file: str, suffix: str = '') -> str:
+    output_file, = results.outputs[source_file]
+    with open(output_file + suffix, 'r') as f:
+        return f.read()
+
+
+def test_depfile(lib_clang_path, tmp_path, write):
+    common_header = write('include/common.h', '#pragma once\n#define VALUE 1\n')
+    nested_header = write('include/nested.h', '#pragma once\n#include "common.h"\n')
+    source_file = write('Foo.h', '#include "include/nested.h"\nenum class EFoo { A = VALUE };\n')
+    results = generate(lib_clang_path, str(tmp_path), [source_file], depfile_target='Foo.stamp')
+    depfile = read_output(results, source_file, '.d')
+    assert depfile.startswith('Foo.stamp:')
+    assert source_file in depfile and nested_header in depfile and common_header in depfile
+
+
+def test_changed_dependency(lib_clang_path, tmp_path, write):
+    write('common.h', '#define VALUE 1\n')
+    source_file = write('Foo.h', '#include "common.h"\nenum class EFoo { A = VALUE };\n')
+    results = generate(lib_clang_path, str(tmp_path), [source_file])
+    assert '(int) 1,' in read_output(results, source_file)
+
+    write('common.h', '#define VALUE 20\n')
+    results = generate(lib_clang_path, str(tmp_path), [source_file])
+    assert '(int) 20,' in read_output(results, source_file)
+
+
+def test_precompiled_header_in_depfile(lib_clang_path, tmp_path, write):
+    # Headers that come from the precompiled header are dependencies too, even though the parse never opens them
+    common_header = write('common.h', '#pragma once\n#define VALUE 1\n')
+    source_file = write('Foo.h', '#include "common.h"\nenum class EFoo { A = VALUE };\n')
+    results = generate(lib_clang_path, str(tmp_path), [source_file], pch_headers=[common_header])
+    assert common_header in read_output(results, source_file, '.d')
@@ -0,0 +1,73 @@
+import os
+import shutil
+
+from codegen import batch
+from codegen import codegen
+from codegen import templates
+
+
+class FieldExtractor(codegen.Extractor):
+    """Lists the fields of structs, as a second extractor next to the enum one"""
+    Name = 'Fields'
+    CursorKinds = ('FIELD_DECL',)
+    PrefilterTokens = ('struct',)
+    TemplateSection = 'fields.mako'
+
+    def CreateModel(self):
+        return []
+
+    def Visit(self, Model, Cursor, Parent):
+        Model.append('%s::%s' % (Parent.spelling, Cursor.spelling))
+        return True
+
+    def HasOutput(self, Model):
+        return bool(Model)
+
+    def ModelFromData(self, Data):
+        return list(Data)
+
+    def ModelToData(self, Model):
+        return list(Model)
+
+
+def run(lib_clang_path: str, root: str, template_path: str, source_file: str) -> batch.BatchResults:
+    options = batch.BatchOptions([], lib_clang_path, root, os.path.join(root, 'out'),
+                                 cache_path=os.path.join(root, 'cache'), template_path=template_path,
+                                 record_timings=True)
+    results = batch.run_batch('generate', [source_file], options)
+    assert not results.errors
+    return results
+
+
+def test_registered_extractor(monkeypatch, lib_clang_path, tmp_path, write):
+    template_path = str(tmp_path / 'templates' / 'template.mako')
+    os.makedirs(os.path.dirname(template_path))
+    shutil.copy(templates.default_template_path, template_path)
+    write('templates/fields.mako', '<%page args="Model"/>\\\n% for Field in Model:\n// Field ${Field}\n% endfor\n')
+    source_file = write('src/Foo.h', 'struct SFoo { enum class EFoo { A }; int Count; float Scale; };\n')
+    root = str(tmp_path / 'src')
+
+    # Models of the enum extractor alone don't stand in for those of both
+    run(lib_clang_path, root, template_path, source_file)
+    monkeypatch.setattr(codegen, 'Extractors', list(codegen.Extractors))
+    codegen.RegisterExtractor(FieldExtractor())
+    assert codegen.GetTemplateSections() == ['enums.mako', 'fields.mako']
+    assert codegen.GetPrefilterTokens() == ['enum', 'struct']
+
+    results = run(lib_clang_path, root, template_path, source_file)
+    assert results.timings.counters.get('analysis_cache_miss') == 1
+    output_file, = results.outputs[source_file]
+    with open(output_file, 'r') as f:
+        output = f.read()
+    # Both extractors saw the same traversal, and each rendered its own section
+    assert 'TEnumReflection<SFoo::EFoo>' in output
+    assert '// Field SFoo::Count\n// Field SFoo::Scale\n' in output
+
+    # Each extractor's model is cached, and read back by the extractor itself
+    results = run(lib_clang_path, root, template_path, source_file)
+    assert results.timings.counters.get('analysis_cache_hit') == 1
+    file = codegen.SourceFile(source_file)
+    file.Models['Fields'] = ['SFoo::Count']
+    data = file.ToData()
+    assert data['Models']['Fields'] == ['SFoo::Count']
+    assert codegen.SourceFile.FromData(source_file, data).Models['Fields'] == ['SFoo::Count']
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from codegen import cli
+from codegen.fileutil import write_file_atomic, write_file_if_changed
+
+
+def test_write_file_if_changed(tmp_path):
+    file_path = str(tmp_path / 'out' / 'Foo.cpp')
+    assert write_file_if_changed(file_path, 'first\n')
+    os.utime(file_path, ns=(0, 0))
+
+    # Identical contents leave the file and its mtime alone
+    assert not write_file_if_changed(file_path, 'first\n')
+    assert os.stat(file_path).st_mtime_ns == 0
+
+    assert write_file_if_changed(file_path, 'second\n')
+    with open(file_path, 'r') as f:
+        assert f.read() == 'second\n'
+    assert os.listdir(str(tmp_path / 'out')) == ['Foo.cpp']
+
+
+def test_write_file_atomic_failure(tmp_path):
+    file_path = str(tmp_path / 'Foo.cpp')
+    write_file_atomic(file_path, 'first\n')
+    with pytest.raises(UnicodeEncodeError):
+        write_file_atomic(file_path, '\ud800')
+    # The old contents stay in place, and no temporary file is left behind
+    with open(file_path, 'r') as f:
+        assert f.read() == 'first\n'
+    assert os.listdir(str(tmp_path)) == ['Foo.cpp']
+
+
+def test_changed_outputs(lib_clang_path, tmp_path, write):
+    source_file = write('src/Foo.h', 'enum class EFoo { A };\n')
+    changed_outputs = str(tmp_path / 'changed.txt')
+    output_file = str(tmp_path / 'out' / 'Foo_h_codegen.cpp')
+
+    def generate():
+        assert cli.main(['generate', source_file, '--libclangpath', lib_clang_path,
+                         '--source-root', str(tmp_path / 'src'), '--output-root', str(tmp_path / 'out'),
+                         '--changed-outputs', changed_outputs]) == 0
+        with open(changed_outputs, 'r') as f:
+            return f.read().splitlines()
+
+    assert generate() == [output_file]
+    os.utime(output_file, ns=(0, 0))
+
+    # An edit that doesn't change the generated code leaves the output untouched, and reports nothing
+    write('src/Foo.h', '// A comment\nenum class EFoo { A };\n')
+    assert generate() == []
+    assert os.stat(output_file).st_mtime_ns == 0
+
+    write('src/Foo.h', 'enum class EFoo { A, B };\n')
+    assert generate() == [output_file]
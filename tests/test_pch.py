@@ -0,0 +1,43 @@
+import os
+
+from codegen import batch
+from codegen import codegen
+from codegen import pch
+
+
+def get_precompiled_header(lib_clang_path: str, headers, cache_path: str) -> str:
+    compile_environment = codegen.CxxCompileEnvironment([])
+    return pch.get_precompiled_header(codegen.CreateClangIndex(lib_clang_path), headers,
+                                      compile_environment.GetClangArgs(), compile_environment.GetParseOptions(),
+                                      lib_clang_path, cache_path)
+
+
+def test_precompiled_header_rebuilt(lib_clang_path, tmp_path, write):
+    # A nested header changing rebuilds the PCH, even though this process already knows about it
+    write('nested.h', '#pragma once\n#define VALUE 1\n')
+    common_header = write('common.h', '#pragma once\n#include "nested.h"\n')
+    cache_path = str(tmp_path / 'cache')
+    pch_path = get_precompiled_header(lib_clang_path, [common_header], cache_path)
+    built = os.stat(pch_path).st_mtime_ns
+    assert get_precompiled_header(lib_clang_path, [common_header], cache_path) == pch_path
+    assert os.stat(pch_path).st_mtime_ns == built
+    assert os.path.join(str(tmp_path), 'nested.h') in pch.get_included_files(pch_path)
+
+    write('nested.h', '#pragma once\n#define VALUE 20\n')
+    assert get_precompiled_header(lib_clang_path, [common_header], cache_path) == pch_path
+    assert os.stat(pch_path).st_mtime_ns != built
+
+
+def test_changed_precompiled_header(lib_clang_path, tmp_path, write):
+    common_header = write('common.h', '#pragma once\n#define VALUE 1\n')
+    source_file = write('Foo.h', '#include "common.h"\nenum class EFoo { A = VALUE };\n')
+    for value in (1, 20):
+        # Changing a header that only comes from the precompiled header rebuilds it, and invalidates the cached model
+        write('common.h', '#pragma once\n#define VALUE %d\n' % value)
+        options = batch.BatchOptions([], lib_clang_path, str(tmp_path), os.path.join(str(tmp_path), 'out'),
+                                     cache_path=os.path.join(str(tmp_path), 'cache'), pch_headers=[common_header])
+        results = batch.run_batch('generate', [source_file], options)
+        assert not results.errors
+        output_file, = results.outputs[source_file]
+        with open(output_file, 'r') as f:
+            assert '(int) %d,' % value in f.read()
@@ -0,0 +1,55 @@
+from codegen import batch
+from codegen import prefilter
+
+
+def test_enum_in_code(write):
+    assert prefilter.may_contain_enum(write('a.h', 'enum class EFoo { A, B };\n'))
+
+
+def test_empty_file(write):
+    assert not prefilter.may_contain_enum(write('a.h', ''))
+
+
+def test_identifiers_containing_enum(write):
+    assert not prefilter.may_contain_enum(write('a.h', 'int enumerate(int enum_count);\nstruct CEnumName;\n'))
+
+
+def test_comments(write):
+    path = write('a.h', '// enum class EFoo\n/* enum\n   class EBar */\n// continued \\\nenum class EBaz\nint x;\n')
+    assert not prefilter.may_contain_enum(path)
+
+
+def test_strings(write):
+    path = write('a.h', 'const char* s = "enum \\" enum";\nchar c = \'"\';\nconst char* t = "enum";\n')
+    assert not prefilter.may_contain_enum(path)
+
+
+def test_raw_strings(write):
+    assert not prefilter.may_contain_enum(write('a.h', 'const char* s = R"x(enum )" enum)x";\n'))
+    # A quote inside a raw string doesn't start a string literal that swallows the rest of the line
+    assert prefilter.may_contain_enum(write('b.h', 'const char* s = R"(")"; enum class EFoo { A };\n'))
+
+
+def test_digit_separators(write):
+    # The separators aren't character literals, which would hide the enum between them
+    assert prefilter.may_contain_enum(write('a.h', "int x = 1'000; enum class EFoo { A }; char c = 'x';\n"))
+
+
+def test_unterminated_character_literal(write):
+    # Apostrophes in preprocessor messages aren't character literals, and must not hide the rest of the file
+    assert prefilter.may_contain_enum(write('a.h', "#error don't\nenum class EFoo { A };\n"))
+
+
+def test_macro_tokens(write):
+    path = write('a.h', 'DECLARE_ENUM(EFoo, A, B)\n')
+    assert not prefilter.may_contain_enum(path)
+    assert prefilter.may_contain_enum(path, ['DECLARE_ENUM'])
+    assert not prefilter.may_contain_enum(write('b.h', '// DECLARE_ENUM(EFoo, A, B)\n'), ['DECLARE_ENUM'])
+
+
+def test_prefilter_token_option(write):
+    path = write('a.h', 'DECLARE_ENUM(EFoo, A, B)\n')
+    options = batch.BatchOptions([], '', '', '')
+    assert not batch.BatchContext(options).passes_prefilter(path)
+    options.prefilter_tokens = ['DECLARE_ENUM']
+    assert batch.BatchContext(options).passes_prefilter(path)
@@ -0,0 +1,53 @@
+import json
+import os
+
+from codegen import scan
+
+
+def test_parse_arguments(tmp_path):
+    directory = str(tmp_path)
+    arguments = ['c++', '-Iinclude', '-I', '/usr/include/foo', '-isystem', 'third_party', '-include', 'prefix.h',
+                 '-DFOO=1', '-D', 'BAR', '-UBAZ', '-std=c++17', '-O2', '-Wall', '-o', 'foo.o', '-c', 'foo.cpp']
+    include_paths, clang_args = scan.parse_arguments(arguments, directory)
+    assert include_paths == [os.path.join(directory, 'include'), os.path.normpath('/usr/include/foo')]
+    assert clang_args == ['-isystem', os.path.join(directory, 'third_party'),
+                          '-include', os.path.join(directory, 'prefix.h'),
+                          '-DFOO=1', '-DBAR', '-UBAZ', '-std=c++17']
+
+
+def test_parse_arguments_drops_c_standard(tmp_path):
+    # Headers are analyzed as C++, whatever a C source is compiled as
+    assert scan.parse_arguments(['cc', '-std=c11', '-I'], str(tmp_path)) == ([], [])
+
+
+def test_load_compile_commands(tmp_path, write):
+    build_directory = str(tmp_path / 'build')
+    write('build/compile_commands.json', json.dumps([
+        {'directory': build_directory, 'file': '../src/a.cpp',
+         'command': 'c++ -I../include "-DNAME=a b" -c ../src/a.cpp'},
+        {'directory': build_directory, 'file': '../src/b.cpp', 'arguments': ['c++', '-DB', '-c', '../src/b.cpp']},
+    ]))
+    # Either the build directory or the database itself can be given
+    for path in (build_directory, os.path.join(build_directory, 'compile_commands.json')):
+        first, second = scan.load_compile_commands(path)
+        assert first.file == str(tmp_path / 'src' / 'a.cpp')
+        assert first.environment == ((str(tmp_path / 'include'),), ('-DNAME=a b',))
+        assert second.file == str(tmp_path / 'src' / 'b.cpp')
+        assert second.environment == ((), ('-DB',))
+
+
+def test_assign_environments(tmp_path):
+    def command(relative_path: str, define: str) -> scan.CompileCommand:
+        return scan.CompileCommand(str(tmp_path / relative_path), [], [define])
+
+    commands = [command('src/a/a.cpp', '-DA'), command('src/a/a2.cpp', '-DA'), command('src/b/b.cpp', '-DB'),
+                command('src/c.cpp', '-DC')]
+    source_files = [str(tmp_path / 'src' / 'a' / 'A.h'), str(tmp_path / 'src' / 'b' / 'nested' / 'B.h'),
+                    str(tmp_path / 'src' / 'C.h'), str(tmp_path / 'other' / 'D.h')]
+    groups = scan.assign_environments(source_files, commands)
+    # Headers take the closest compile command above them, and the most common arguments when there is none
+    assert groups == {
+        ((), ('-DA',)): [source_files[0], source_files[3]],
+        ((), ('-DB',)): [source_files[1]],
+        ((), ('-DC',)): [source_files[2]],
+    }
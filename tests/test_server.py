@@ -0,0 +1,54 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from codegen import client, server
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs Unix domain sockets')
+
+
+def listen(tmp_path) -> tuple:
+    socket_path = os.path.join(str(tmp_path), 's.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(8)
+    return listener, socket_path
+
+
+def test_server_closing_without_answer(tmp_path):
+    listener, socket_path = listen(tmp_path)
+
+    def close_connection():
+        connection, _ = listener.accept()
+        connection.close()
+
+    thread = threading.Thread(target=close_connection)
+    thread.start()
+    try:
+        # The client falls back to running the command itself rather than failing
+        assert client.send_request(socket_path, {'argv': ['generate'], 'cwd': str(tmp_path)}) is None
+    finally:
+        thread.join()
+        listener.close()
+
+
+def test_queued_connections_answered_on_shutdown(tmp_path):
+    listener, socket_path = listen(tmp_path)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(socket_path)
+    client.send_message(connection, {'argv': ['watch'], 'cwd': str(tmp_path)})
+
+    # Idle from the start, so the server stops serving before accepting the connection
+    instance = server.Server(1, 0.0)
+    try:
+        instance.serve(listener)
+        instance.accept_queued(listener)
+        listener.close()
+        response = client.receive_message(connection)
+    finally:
+        connection.close()
+        instance.shut_down()
+    assert response['returncode'] == 1
+    assert 'not supported' in response['stderr']
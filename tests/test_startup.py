@@ -0,0 +1,28 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+bench_startup_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'bench_startup.py')
+
+
+def load_bench_startup():
+    spec = importlib.util.spec_from_file_location('bench_startup', bench_startup_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_help_imports(tmp_path):
+    bench_startup = load_bench_startup()
+    imported = set(bench_startup.get_imported_modules(
+        bench_startup.run_tool(['--help'], str(tmp_path), import_time=True)[1]))
+    assert not [module for module in imported if module == 'clang' or module.startswith('clang.')]
+    assert 'mako.runtime' not in imported
+
+
+def test_startup_budget(lib_clang_path):
+    # Cache hits stay clear of libclang and the template compiler, and within the benchmark's default budget
+    process = subprocess.run([sys.executable, bench_startup_path, '--libclangpath', lib_clang_path, '--repeat', '3'],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    assert process.returncode == 0, process.stdout
@@ -0,0 +1,46 @@
+from codegen import store
+
+
+def test_default_max_size(tmp_path):
+    result_store = store.ResultStore(str(tmp_path))
+    assert result_store.max_size == store.default_max_size
+    assert 'Size cap:        1.0 GB' in result_store.format_stats()
+
+
+def test_max_size_is_recorded(tmp_path):
+    result_store = store.ResultStore(str(tmp_path), 100)
+    for index in range(4):
+        result_store.store('%064x' % index, 'output', 'x' * 40)
+    assert result_store.read_stats()['size'] <= 100
+
+    # Processes that don't give a cap of their own keep the store under the recorded one
+    result_store = store.ResultStore(str(tmp_path))
+    assert result_store.max_size == 100
+    assert 'Size cap:        100 B' in result_store.format_stats()
+    result_store.store('%064x' % 4, 'output', 'x' * 80)
+    assert result_store.read_stats()['size'] <= 100
+
+
+def test_lookups_counted_without_lock(monkeypatch, tmp_path):
+    result_store = store.ResultStore(str(tmp_path))
+    result_store.store('%064x' % 0, 'output', 'x')
+
+    def lock():
+        raise AssertionError('Lookups took the lock')
+
+    monkeypatch.setattr(result_store, 'lock', lock)
+    assert result_store.load('%064x' % 0, 'output') == 'x'
+    assert result_store.load('%064x' % 1, 'output') is None
+    monkeypatch.undo()
+
+    result_store.flush_stats()
+    stats = result_store.read_stats()
+    assert (stats['hits'], stats['misses'], stats['stores'], stats['entries']) == (1, 1, 1, 1)
+
+
+def test_stats_of_missing_store(tmp_path, capsys):
+    from codegen import cli
+    store_path = str(tmp_path / 'store')
+    assert cli.main(['stats', '--store', store_path]) == 0
+    assert 'No store at' in capsys.readouterr().out
+    assert not (tmp_path / 'store').exists()
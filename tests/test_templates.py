@@ -0,0 +1,24 @@
+import os
+import shutil
+
+from codegen import batch, templates
+
+
+def test_custom_section_with_cache(lib_clang_path, tmp_path, write):
+    # A custom template identical to the built-in one, with its own enums section beside it
+    custom_template = str(tmp_path / 'custom' / 'template.mako')
+    os.makedirs(os.path.dirname(custom_template))
+    shutil.copy(templates.default_template_path, custom_template)
+    write('custom/enums.mako', '<%page args="Model"/>\\\n// Custom enums section\n')
+    source_file = write('src/Foo.h', 'enum class EFoo { A };\n')
+
+    cache_path = str(tmp_path / 'cache')
+    for template_path, output_root in ((None, 'out'), (custom_template, 'custom_out')):
+        options = batch.BatchOptions([], lib_clang_path, str(tmp_path / 'src'), str(tmp_path / output_root),
+                                     cache_path=cache_path, template_path=template_path)
+        results = batch.run_batch('generate', [source_file], options)
+        assert not results.errors
+
+    output_file, = results.outputs[source_file]
+    with open(output_file, 'r') as f:
+        assert '// Custom enums section' in f.read()
@@ -0,0 +1,31 @@
+import os
+
+from codegen import batch
+from codegen import unity
+
+
+def test_chunk_name_pool(lib_clang_path, tmp_path, write):
+    source_files = [write('Foo.h', 'enum class EFoo { None, Count };\n'),
+                    write('Bar.h', 'enum class EBar { None, MaxCount };\n')]
+    options = batch.BatchOptions([], lib_clang_path, str(tmp_path), os.path.join(str(tmp_path), 'out'),
+                                 unity_chunks=1)
+    results = batch.run_batch('generate', source_files, options)
+    assert not results.errors
+    batch.write_unity_chunks(results, options)
+
+    # The fragments refer to one pool in the chunk, which holds names they share once
+    chunk_file = unity.get_chunk_file(options.output_root, 0)
+    assert sorted(unity.read_chunk_fragments(chunk_file)) == sorted(sum(results.outputs.values(), []))
+    with open(unity.get_chunk_names_file(chunk_file), 'r') as f:
+        names = f.read()
+    assert names.count('"None\\0"') == 1
+    assert '"Count\\0"' not in names
+    assert 'kName_MaxCount = 0,' in names
+    assert 'kName_Count = 3,' in names
+
+    # Regenerating a fragment at build time leaves the pool to be written again from the fragments
+    write('Foo.h', 'enum class EFoo { None, Count, Extra };\n')
+    batch.run_batch('generate', source_files[:1], options)
+    assert unity.write_chunk_names(chunk_file)
+    with open(unity.get_chunk_names_file(chunk_file), 'r') as f:
+        assert 'kName_Extra' in f.read()
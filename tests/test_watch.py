@@ -0,0 +1,38 @@
+import io
+import os
+
+from codegen import batch
+from codegen import watch
+
+
+def read_output(session: watch.Watch, source_file: str) -> str:
+    output_file, = session.outputs[source_file]
+    with open(output_file, 'r') as f:
+        return f.read()
+
+
+def test_precompiled_header_changed(lib_clang_path, tmp_path, write):
+    # common.h is precompiled; values.h only reaches the source files through it
+    values_header = write('values.h', '#define VALUE 1\n')
+    common_header = write('common.h', '#pragma once\n#include "values.h"\n')
+    source_files = [write('Foo.h', '#include "common.h"\nenum class EFoo { A = VALUE };\n'),
+                    write('Bar.h', '#include "common.h"\nenum class EBar { A = VALUE + 1 };\n')]
+    options = batch.BatchOptions([], lib_clang_path, str(tmp_path), os.path.join(str(tmp_path), 'out'),
+                                 cache_path=os.path.join(str(tmp_path), 'cache'), pch_headers=[common_header])
+    log = io.StringIO()
+    session = watch.Watch(source_files, options, log)
+    session.generate(source_files, report=False)
+    assert '(int) 1,' in read_output(session, source_files[0])
+    assert '(int) 2,' in read_output(session, source_files[1])
+
+    for header, text, value in ((values_header, '#define VALUE 10\n', 10),
+                                (common_header, '#pragma once\n#include "values.h"\n#define EXTRA 1\n', 10),
+                                (values_header, '#define VALUE 100\n', 100)):
+        write(os.path.relpath(header, str(tmp_path)), text)
+        log.seek(0)
+        log.truncate()
+        session.on_changed({header})
+        assert 'Precompiled header changed; reparsing every source file' in log.getvalue()
+        assert 'Error' not in log.getvalue()
+        assert '(int) %d,' % value in read_output(session, source_files[0])
+        assert '(int) %d,' % (value + 1) in read_output(session, source_files[1])